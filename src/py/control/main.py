@@ -1,13 +1,45 @@
+from py.control.micro_batcher import MicroBatcher
 from py.control.model_type import ModelType
+from object_detector import ObjectDetector
 from robomaster_vision_control import RoboMasterVisionControl
+import threading
 
 def main():
 
     model_type = _get_user_model_choice()
-    control = RoboMasterVisionControl(model_type)
+    serial_numbers = _get_robot_serial_numbers()
+    if len(serial_numbers) > 1:
+        _run_fleet(model_type, serial_numbers)
+        return
+    control = RoboMasterVisionControl(model_type, sn=serial_numbers[0] if serial_numbers else None)
     control.run()
 
 
+def _run_fleet(model_type: ModelType, serial_numbers):
+    # One detector serves every robot: their frames are micro-batched into a single forward pass, source index i
+    # keeps the tracking state of robot i apart
+    detector = ObjectDetector(model_type)
+    batcher = MicroBatcher(detector, max_batch_size=len(serial_numbers), max_wait_ms=10).start()
+    stop_event = threading.Event()
+    controls = [RoboMasterVisionControl(model_type, detector, batcher, source=i, sn=sn, stop_event=stop_event)
+                for i, sn in enumerate(serial_numbers)]
+    controls = [control for control in controls if control.start()]
+
+    try:
+        while controls and not stop_event.is_set():
+            for control in controls:
+                control.step_display(timeout=0.01)
+
+    except Exception as e:
+        print(f"Main loop error: {e}")
+    finally:
+        stop_event.set()
+        batcher.stop()
+        for control in controls:
+            control.stop()
+        print(f"Average batch size: {batcher.avg_batch_size:.2f}")
+
+
 def _get_user_model_choice() -> ModelType:
     while True:
         choice = input(
@@ -18,6 +50,10 @@ def _get_user_model_choice() -> ModelType:
             return ModelType.COCO
         print("Invalid choice. Please enter 1 or 2.")
 
+
+def _get_robot_serial_numbers():
+    choice = input("Robot serial numbers, comma separated (empty for a single robot in AP mode): ")
+    return [sn.strip() for sn in choice.split(",") if sn.strip()]
+
 if __name__ == "__main__":
     main()
-
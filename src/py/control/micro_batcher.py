@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects frames from several sources and runs them through one shared ObjectDetector as a single batch, each frame
+    tagged with its source index so the detector keeps tracking state per source.
+
+    A batch is dispatched once `max_batch_size` frames are waiting or `max_wait_ms` has passed since the first frame
+    of the batch arrived, so a larger window trades per-frame latency for throughput.
+    """
+
+    def __init__(self, detector, max_batch_size=4, max_wait_ms=10):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1e3
+        self.requests = queue.Queue()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.batch_count = 0
+        self.frame_count = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._worker, name="micro-batcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    @property
+    def avg_batch_size(self):
+        return self.frame_count / self.batch_count if self.batch_count else 0.0
+
+    def submit(self, frame, source=0):
+        future = Future()
+        self.requests.put((frame, source, future))
+        return future
+
+    def detect(self, frame, source=0, timeout=None):
+        return self.submit(frame, source).result(timeout)
+
+    def _collect(self):
+        batch = [self.requests.get(timeout=0.1)]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                batch = self._collect()
+            except queue.Empty:
+                continue
+
+            frames = [frame for frame, _, _ in batch]
+            sources = [source for _, source, _ in batch]
+            try:
+                results = self.detector.detect_batch(frames, sources)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batch_count += 1
+            self.frame_count += len(batch)
+            for (_, _, future), result in zip(batch, results):
+                future.set_result(result)
@@ -1,8 +1,10 @@
 import torch
 from torch.amp import autocast
 import cv2
+import numpy as np
 import os
 import pathlib
+import time
 
 from py.control.model_type import ModelType
 
@@ -11,6 +13,10 @@ pathlib.PosixPath = pathlib.WindowsPath
 
 import sys
 sys.path.append(r'src/py/yolov5')
+sys.path.append(os.path.normpath(os.path.join(os.path.dirname(__file__), '../../py/yolov5')))
+
+from utils.augmentations import letterbox
+from utils.general import make_divisible, non_max_suppression_candidates, scale_boxes
 
 
 class ObjectDetector:
@@ -38,30 +44,84 @@ class ObjectDetector:
             source='local'
         )
 
-        self.stable_detections = None
+        self.stride = int(self.model.stride)
+        self.img_size = 640
+
+        # Tracking state per source index, so frames from different cameras do not reset each other's counters
+        self.stable_detections = {}
         self.tracking_threshold = 3
-        self.frame_stability_count = 0
+        self.frame_stability_count = {}
 
         if self.model_type == ModelType.PISTOL:
             self.model.names = {0: 'Pistol'}
 
-    def detect(self, frame):
+    def detect(self, frame, source=0):
+        return self.detect_batch([frame], [source])[0]
+
+    def detect_batch(self, frames, sources=None):
+        # Letterboxes frames from several sources into one tensor and runs a single forward pass, `sources` holds the
+        # source index of every frame and defaults to one source per frame
+        try:
+            packet = self.infer(self.preprocess_batch(frames, sources))
+        except Exception as e:
+            print(f"Detection error: {e}")
+            return [(frame, None) for frame in frames]
+        return self.postprocess_batch(packet)
+
+    def preprocess(self, frame, source=0):
+        return self.preprocess_batch([frame], [source])
+
+    def preprocess_batch(self, frames, sources=None):
+        # Same letterbox as AutoShape.forward, split out so it can run on its own pipeline stage
+        shape0 = [frame.shape[:2] for frame in frames]
+        shape1 = np.array([[int(x * self.img_size / max(s)) for x in s] for s in shape0]).max(0)
+        shape1 = [make_divisible(x, self.stride) for x in shape1]
+        im = np.stack([letterbox(frame, shape1, auto=False)[0] for frame in frames])
+        im = torch.from_numpy(np.ascontiguousarray(im.transpose((0, 3, 1, 2))))  # BHWC to BCHW, uint8
+        sources = list(range(len(frames))) if sources is None else list(sources)
+        return {'frames': frames, 'sources': sources, 'input': im, 'shape0': shape0, 'shape1': shape1}
+
+    def infer(self, packet):
+        start_time = time.time()
+        param = next(self.model.parameters())
+        with torch.inference_mode(), autocast(device_type='cuda', dtype=torch.float16):
+            # Detect head decodes only anchors above the NMS confidence threshold and returns per-image candidates
+            packet['pred'] = self.model.model(packet['input'].to(param.device).type_as(param) / 255,
+                                              conf_thres=self.model.conf)
+        packet['detection_time'] = time.time() - start_time
+        return packet
+
+    def postprocess(self, packet):
+        return self.postprocess_batch(packet)[0]
+
+    def postprocess_batch(self, packet):
+        try:
+            pred = non_max_suppression_candidates(packet['pred'], self.model.conf, self.model.iou,
+                                                  self.model.classes, self.model.agnostic, self.model.multi_label,
+                                                  max_det=self.model.max_det, batched=True)
+        except Exception as e:
+            print(f"Detection error: {e}")
+            return [(frame, None) for frame in packet['frames']]
+
+        results = []
+        for frame, source, shape0, detections in zip(packet['frames'], packet['sources'], packet['shape0'], pred):
+            scale_boxes(packet['shape1'], detections[:, :4], shape0)
+            results.append(self._process_detections(frame, detections, source))
+        return results
+
+    def _process_detections(self, frame, detections, source=0):
         try:
             frame_height, frame_width = frame.shape[:2]
             frame_center_x = frame_width / 2
             frame_center_y = frame_height / 2
 
-            with autocast(device_type='cuda', dtype=torch.float16):
-                results = self.model(frame)
-            detections = results.xyxy[0]
-
             # Filter based on confidence threshold
             conf_detections = detections[detections[:, 4] >= self.confidence_threshold]
 
             target_info = None
             if len(conf_detections) > 0:
-                self.frame_stability_count = 0
-                self.stable_detections = conf_detections
+                self.frame_stability_count[source] = 0
+                self.stable_detections[source] = conf_detections
 
                 # For pistol model, get highest confidence detection
                 if self.model_type == ModelType.PISTOL:
@@ -89,7 +149,7 @@ class ObjectDetector:
                     cv2.drawMarker(frame, (center_x, center_y), (0, 0, 255),
                                    cv2.MARKER_CROSS, 20, 2)
             else:
-                self.frame_stability_count += 1
+                self.frame_stability_count[source] = self.frame_stability_count.get(source, 0) + 1
 
         except Exception as e:
             print(f"Detection error: {e}")
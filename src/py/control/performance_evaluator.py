@@ -18,6 +18,7 @@ class PerformanceEvaluator:
             'target_losses': 0,
             'tracking_accuracy': []
         }
+        self.pipeline_stats = {}
 
         base_output_dir = os.path.dirname(__file__)
         self.output_dir = os.path.join(f'/../../{base_output_dir}', 'performance_reports')
@@ -55,6 +56,9 @@ class PerformanceEvaluator:
         else:
             self.tracking_stats['target_losses'] += 1
 
+    def log_pipeline_stats(self, stats):
+        self.pipeline_stats = stats
+
     def generate_visualization_report(self):
         plt.style.use('seaborn')
         self._plot_metric(self.detection_times, 'Detection Time Distribution', 'Time (s)', 'detection_time.png')
@@ -86,6 +90,11 @@ class PerformanceEvaluator:
             f.write(f"Tracking Success Rate: {success_rate:.2f}%\n")
             f.write(f"Avg Tracking Accuracy: {np.mean(self.tracking_stats['tracking_accuracy']):.4f}\n" if
                     self.tracking_stats['tracking_accuracy'] else "No valid tracking accuracy data\n")
+            if self.pipeline_stats:
+                f.write("\nPipeline Stages\n" + "-" * 30 + "\n")
+                for name, stats in self.pipeline_stats.items():
+                    f.write(f"{name}: {stats['count']} frames, avg {stats['avg_ms']:.2f}ms, max {stats['max_ms']:.2f}ms, "
+                            f"queue depth {stats.get('max_queue_depth', 0)}, dropped {stats.get('dropped', 0)}\n")
         print(f"Report saved in: {self.output_dir}")
 
     @staticmethod
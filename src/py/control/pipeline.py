@@ -0,0 +1,170 @@
+import queue
+import threading
+import time
+from collections import deque
+
+
+class RingBuffer:
+    """Bounded frame buffer that drops the oldest entry instead of blocking the producer."""
+
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self._items = deque(maxlen=maxsize)
+        self._not_empty = threading.Condition()
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, item):
+        with self._not_empty:
+            if len(self._items) == self.maxsize:
+                self.dropped += 1
+            self._items.append(item)  # deque(maxlen) evicts the oldest entry
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._not_empty.notify()
+
+    def get(self, timeout=None):
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: len(self._items) > 0, timeout):
+                raise queue.Empty
+            return self._items.popleft()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed):
+        with self._lock:
+            self.count += 1
+            self.total_time += elapsed
+            self.last_time = elapsed
+            self.max_time = max(self.max_time, elapsed)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'count': self.count,
+                'errors': self.errors,
+                'avg_ms': self.total_time / self.count * 1e3 if self.count else 0.0,
+                'last_ms': self.last_time * 1e3,
+                'max_ms': self.max_time * 1e3,
+            }
+
+
+class PipelineStage:
+    """
+    One step of the vision pipeline.
+
+    A stage without an input buffer is a source and calls `fn()` to produce items, every other stage calls
+    `fn(item)` on the next item of its input buffer. Returning None drops the item.
+    """
+
+    def __init__(self, name, fn, stop_event, input_buffer=None, output_buffer=None, threaded=True):
+        self.name = name
+        self.fn = fn
+        self.stop_event = stop_event
+        self.input = input_buffer
+        self.output = output_buffer
+        self.threaded = threaded
+        self.stats = StageStats()
+        self.thread = None
+
+    def step(self, timeout=0.1):
+        item = None
+        if self.input is not None:
+            try:
+                item = self.input.get(timeout=timeout)
+            except queue.Empty:
+                return False
+
+        start_time = time.perf_counter()
+        try:
+            result = self.fn() if self.input is None else self.fn(item)
+        except Exception as e:
+            self.stats.record_error()
+            print(f"{self.name} stage error: {e}")
+            return False
+        self.stats.record(time.perf_counter() - start_time)
+
+        if result is None:
+            return False
+        if self.output is not None:
+            self.output.put(result)
+        return True
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            self.step()
+
+    def start(self):
+        if self.threaded:
+            self.thread = threading.Thread(target=self._worker, name=f"pipeline-{self.name}", daemon=True)
+            self.thread.start()
+
+    def join(self, timeout=None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+class VisionPipeline:
+    """
+    Chain of stages connected by drop-oldest ring buffers.
+
+    Every threaded stage runs on its own worker, so throughput is bound by the slowest stage rather than by the sum of
+    all stages. Stages added with `threaded=False` (e.g. cv2 GUI calls, which must stay on the main thread) are driven
+    by the caller through `step()`.
+    """
+
+    def __init__(self, stop_event, buffer_size=1):
+        self.stop_event = stop_event
+        self.buffer_size = buffer_size
+        self.stages = []
+        self.buffers = {}
+
+    def add_stage(self, name, fn, threaded=True):
+        input_buffer = None
+        if self.stages:
+            input_buffer = self.stages[-1].output = RingBuffer(self.buffer_size)
+            self.buffers[name] = input_buffer
+        stage = PipelineStage(name, fn, self.stop_event, input_buffer, threaded=threaded)
+        self.stages.append(stage)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def step(self, name, timeout=0.1):
+        return self.stage(name).step(timeout)
+
+    def stage(self, name):
+        return next(s for s in self.stages if s.name == name)
+
+    def join(self, timeout=1.0):
+        self.stop_event.set()
+        for stage in self.stages:
+            stage.join(timeout)
+
+    def stats(self):
+        stats = {}
+        for stage in self.stages:
+            stage_stats = stage.stats.snapshot()
+            buffer = self.buffers.get(stage.name)
+            if buffer is not None:
+                stage_stats['queue_depth'] = len(buffer)
+                stage_stats['max_queue_depth'] = buffer.max_depth
+                stage_stats['dropped'] = buffer.dropped
+            stats[stage.name] = stage_stats
+        return stats
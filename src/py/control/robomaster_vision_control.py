@@ -1,5 +1,4 @@
 import threading
-import queue
 import cv2
 import keyboard
 from robomaster import robot
@@ -8,15 +7,20 @@ import time
 
 from py.control.model_type import ModelType
 from py.control.performance_evaluator import PerformanceEvaluator
+from py.control.pipeline import VisionPipeline
 
 
 class RoboMasterVisionControl:
-    def __init__(self,model_type: ModelType):
+    def __init__(self, model_type: ModelType, detector=None, batcher=None, source=0, sn=None, stop_event=None):
+        # With a shared MicroBatcher several robots (one source index each) run through one detector in one process
         self.model_type = model_type
         self.robot = robot.Robot()
-        self.detector = ObjectDetector(model_type)
-        self.stop_event = threading.Event()
-        self.frame_queue = queue.Queue(maxsize=1)
+        self.detector = detector if detector is not None else ObjectDetector(model_type)
+        self.batcher = batcher
+        self.source = source
+        self.sn = sn
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.pipeline = None
         self.camera = None
         self.chassis = None
         self.gimbal = None
@@ -31,7 +35,10 @@ class RoboMasterVisionControl:
 
     def initialize(self):
         try:
-            self.robot.initialize(conn_type="ap", proto_type="tcp")
+            if self.sn is None:
+                self.robot.initialize(conn_type="ap", proto_type="tcp")
+            else:
+                self.robot.initialize(conn_type="sta", proto_type="tcp", sn=self.sn)
             self.camera = self.robot.camera
             self.chassis = self.robot.chassis
             self.gimbal = self.robot.gimbal
@@ -42,70 +49,93 @@ class RoboMasterVisionControl:
             return False
         return True
 
-    def camera_capture_thread(self):
-        while not self.stop_event.is_set():
+    def capture_frame(self):
+        try:
+            return self.camera.read_cv2_image(strategy="newest", timeout=0.1)
+        except Exception as e:
+            print(f"Camera capture error: {e}")
+            print("Attempting to reconnect camera...")
             try:
-                frame = self.camera.read_cv2_image(strategy="newest", timeout=0.1)
-                if frame is not None:
-                    if not self.frame_queue.empty():
-                        self.frame_queue.get()
-                    self.frame_queue.put(frame)
-            except Exception as e:
-                print(f"Camera capture error: {e}")
-                print("Attempting to reconnect camera...")
-                try:
-                    # Stop and restart video stream
-                    self.camera.stop_video_stream()
-                    self.camera.start_video_stream(display=False)
-                    print("Camera reconnected successfully")
-                except Exception as reconnect_error:
-                    print(f"Reconnection failed: {reconnect_error}")
+                # Stop and restart video stream
+                self.camera.stop_video_stream()
+                self.camera.start_video_stream(display=False)
+                print("Camera reconnected successfully")
+            except Exception as reconnect_error:
+                print(f"Reconnection failed: {reconnect_error}")
+        return None
+
+    def detect_step(self, frame):
+        start_time = time.time()
+        detected_frame, target_info = self.batcher.detect(frame, self.source)
+        return {'frame': detected_frame, 'target_info': target_info, 'detection_time': time.time() - start_time}
+
+    def control_step(self, packet):
+        if self.batcher is None:
+            detected_frame, target_info = self.detector.postprocess(packet)
+        else:
+            detected_frame, target_info = packet['frame'], packet['target_info']
 
-    def run(self):
-        if not self.initialize():
-            return
+        self.evaluator.log_detection(packet['detection_time'], target_info)
 
-        camera_thread = threading.Thread(target=self.camera_capture_thread)
-        camera_thread.start()
+        if self.model_type == ModelType.PISTOL and target_info:
+            self.evaluator.log_tracking(target_info)
 
-        try:
-            while not self.stop_event.is_set():
-                try:
-                    frame = self.frame_queue.get(timeout=0.1)
-                    start_time = time.time()
-                    detected_frame, target_info = self.detector.detect(frame)
-                    detection_time = time.time() - start_time
+            self.track_and_shoot(target_info)
+        else:
+            x_speed, y_speed, z_speed = self.get_chassis_input()
+            self.chassis.drive_speed(x=x_speed, y=y_speed, z=z_speed)
 
-                    self.evaluator.log_detection(detection_time, target_info)
+            pitch, yaw = self.get_gimbal_input()
+            self.gimbal.drive_speed(pitch_speed=pitch, yaw_speed=yaw)
 
-                    if self.model_type == ModelType.PISTOL and target_info:
-                        yaw_speed = self.gimbal_speed * target_info['x_offset']
-                        pitch_speed = -self.gimbal_speed * target_info['y_offset']
+            if target_info:
+                self.evaluator.log_tracking(target_info)
 
-                        self.evaluator.log_tracking(target_info)
+        return detected_frame
 
-                        self.track_and_shoot(target_info)
-                    else:
-                        x_speed, y_speed, z_speed = self.get_chassis_input()
-                        self.chassis.drive_speed(x=x_speed, y=y_speed, z=z_speed)
+    def display_frame(self, frame):
+        cv2.imshow("RoboMaster S1" if self.sn is None else f"RoboMaster S1 {self.sn}", frame)
+        return frame
 
-                        pitch, yaw = self.get_gimbal_input()
-                        self.gimbal.drive_speed(pitch_speed=pitch, yaw_speed=yaw)
+    def start(self):
+        if not self.initialize():
+            return False
 
-                        if target_info:
-                            self.evaluator.log_tracking(target_info)
+        # capture -> preprocess -> inference -> postprocess/control each run on their own worker, display stays on
+        # the main thread because cv2 GUI calls are not thread safe. With a batcher, preprocess and inference are one
+        # stage that hands the frame to the shared MicroBatcher and waits for its batch
+        self.pipeline = VisionPipeline(self.stop_event)
+        self.pipeline.add_stage("capture", self.capture_frame)
+        if self.batcher is None:
+            self.pipeline.add_stage("preprocess", self.detector.preprocess)
+            self.pipeline.add_stage("inference", self.detector.infer)
+        else:
+            self.pipeline.add_stage("inference", self.detect_step)
+        self.pipeline.add_stage("control", self.control_step)
+        self.pipeline.add_stage("display", self.display_frame, threaded=False)
+        self.pipeline.start()
+        return True
 
-                    cv2.imshow("RoboMaster S1", detected_frame)
-                except queue.Empty:
-                    continue
+    def step_display(self, timeout=0.1):
+        if self.pipeline.step("display", timeout) and cv2.waitKey(1) & 0xFF == 27:
+            self.stop_event.set()
 
-                if cv2.waitKey(1) & 0xFF == 27:
-                    self.stop_event.set()
+    def stop(self):
+        self.pipeline.join()
+        self.cleanup()
+
+    def run(self):
+        if not self.start():
+            return
+
+        try:
+            while not self.stop_event.is_set():
+                self.step_display()
 
         except Exception as e:
             print(f"Main loop error: {e}")
         finally:
-            self.cleanup()
+            self.stop()
 
     def track_and_shoot(self, target_info):
         # Calculate gimbal movements
@@ -176,5 +206,7 @@ class RoboMasterVisionControl:
         self.chassis.drive_speed(x=0, y=0, z=0)
         self.gimbal.drive_speed(pitch_speed=0, yaw_speed=0)
         self.robot.close()
+        if self.pipeline:
+            self.evaluator.log_pipeline_stats(self.pipeline.stats())
         self.evaluator.save_report()
         cv2.destroyAllWindows()
\ No newline at end of file
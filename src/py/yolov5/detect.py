@@ -29,7 +29,6 @@ Usage - formats:
 """
 
 import argparse
-import csv
 import os
 import platform
 import sys
@@ -57,12 +56,13 @@ from utils.general import (
     colorstr,
     cv2,
     increment_path,
-    non_max_suppression,
+    non_max_suppression_candidates,
     print_args,
-    scale_boxes,
     strip_optimizer,
     xyxy2xywh,
 )
+from utils.postprocess import select_postprocess
+from utils.sinks import ResultWriter
 from utils.torch_utils import select_device, smart_inference_mode
 
 
@@ -97,6 +97,9 @@ def run(
     half=False,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
     vid_stride=1,  # video frame-rate stride
+    batch_size=1,  # batch size for images and videos, needs workers > 0
+    workers=0,  # image/frame decode threads, 0 to decode inline
+    prefilter=False,  # PyTorch models: decode only anchors above conf_thres in the Detect head
 ):
     """
     Runs YOLOv5 detection inference on various sources like images, videos, directories, streams, etc.
@@ -133,6 +136,11 @@ def run(
         half (bool): If True, use FP16 half-precision inference. Default is False.
         dnn (bool): If True, use OpenCV DNN backend for ONNX inference. Default is False.
         vid_stride (int): Stride for processing video frames, to skip frames between processing. Default is 1.
+        batch_size (int): Batch size for image and video sources, used when `workers` > 0. Default is 1.
+        workers (int): Number of threads decoding images and letterboxing frames ahead of inference, 0 decodes inline
+            on the main thread. Default is 0.
+        prefilter (bool): If True, PyTorch models decode only anchors with objectness above `conf_thres` in the Detect
+            head and NMS runs on those candidates. Ignored with `augment`. Default is False.
 
     Returns:
         None
@@ -166,6 +174,10 @@ def run(
     model = DetectMultiBackend(weights, device=device, dnn=dnn, data=data, fp16=half)
     stride, names, pt = model.stride, model.names, model.pt
     imgsz = check_img_size(imgsz, s=stride)  # check image size
+    prefilter = prefilter and pt and not augment  # augmented inference needs the full output
+    postprocess = select_postprocess(model, device)  # NumPy NMS for ONNX Runtime, OpenCV DNN and OpenVINO on CPU
+    model.numpy_outputs = postprocess.numpy  # keep NumPy runtime outputs for the NumPy backend
+    nms = non_max_suppression_candidates if prefilter else postprocess.non_max_suppression
 
     # Dataloader
     bs = 1  # batch_size
@@ -176,140 +188,126 @@ def run(
     elif screenshot:
         dataset = LoadScreenshots(source, img_size=imgsz, stride=stride, auto=pt)
     else:
-        dataset = LoadImages(source, img_size=imgsz, stride=stride, auto=pt, vid_stride=vid_stride)
-    vid_path, vid_writer = [None] * bs, [None] * bs
-
-    # Run inference
-    model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
-    seen, windows, dt = 0, [], (Profile(device=device), Profile(device=device), Profile(device=device))
-    for path, im, im0s, vid_cap, s in dataset:
-        with dt[0]:
-            im = torch.from_numpy(im).to(model.device)
-            im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
-            im /= 255  # 0 - 255 to 0.0 - 1.0
-            if len(im.shape) == 3:
-                im = im[None]  # expand for batch dim
-            if model.xml and im.shape[0] > 1:
-                ims = torch.chunk(im, im.shape[0], 0)
-
-        # Inference
-        with dt[1]:
-            visualize = increment_path(save_dir / Path(path).stem, mkdir=True) if visualize else False
-            if model.xml and im.shape[0] > 1:
-                pred = None
-                for image in ims:
-                    if pred is None:
-                        pred = model(image, augment=augment, visualize=visualize).unsqueeze(0)
-                    else:
-                        pred = torch.cat((pred, model(image, augment=augment, visualize=visualize).unsqueeze(0)), dim=0)
-                pred = [pred, None]
-            else:
-                pred = model(im, augment=augment, visualize=visualize)
-        # NMS
-        with dt[2]:
-            pred = non_max_suppression(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
-
-        # Second-stage classifier (optional)
-        # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
-
-        # Define the path for the CSV file
-        csv_path = save_dir / "predictions.csv"
-
-        # Create or append to the CSV file
-        def write_to_csv(image_name, prediction, confidence):
-            """Writes prediction data for an image to a CSV file, appending if the file exists."""
-            data = {"Image Name": image_name, "Prediction": prediction, "Confidence": confidence}
-            file_exists = os.path.isfile(csv_path)
-            with open(csv_path, mode="a", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=data.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(data)
-
-        # Process predictions
-        for i, det in enumerate(pred):  # per image
-            seen += 1
-            if webcam:  # batch_size >= 1
-                p, im0, frame = path[i], im0s[i].copy(), dataset.count
-                s += f"{i}: "
-            else:
-                p, im0, frame = path, im0s.copy(), getattr(dataset, "frame", 0)
-
-            p = Path(p)  # to Path
-            save_path = str(save_dir / p.name)  # im.jpg
-            txt_path = str(save_dir / "labels" / p.stem) + ("" if dataset.mode == "image" else f"_{frame}")  # im.txt
-            s += "{:g}x{:g} ".format(*im.shape[2:])  # print string
-            gn = torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
-            imc = im0.copy() if save_crop else im0  # for save_crop
-            annotator = Annotator(im0, line_width=line_thickness, example=str(names))
-            if len(det):
-                # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
-
-                # Print results
-                for c in det[:, 5].unique():
-                    n = (det[:, 5] == c).sum()  # detections per class
-                    s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
-
-                # Write results
-                for *xyxy, conf, cls in reversed(det):
-                    c = int(cls)  # integer class
-                    label = names[c] if hide_conf else f"{names[c]}"
-                    confidence = float(conf)
-                    confidence_str = f"{confidence:.2f}"
-
-                    if save_csv:
-                        write_to_csv(p.name, label, confidence_str)
-
-                    if save_txt:  # Write to file
-                        if save_format == 0:
-                            coords = (
-                                (xyxy2xywh(torch.tensor(xyxy).view(1, 4)) / gn).view(-1).tolist()
-                            )  # normalized xywh
-                        else:
-                            coords = (torch.tensor(xyxy).view(1, 4) / gn).view(-1).tolist()  # xyxy
-                        line = (cls, *coords, conf) if save_conf else (cls, *coords)  # label format
-                        with open(f"{txt_path}.txt", "a") as f:
-                            f.write(("%g " * len(line)).rstrip() % line + "\n")
-
-                    if save_img or save_crop or view_img:  # Add bbox to image
+        dataset = LoadImages(source, imgsz, stride, pt, vid_stride=vid_stride, batch_size=batch_size, workers=workers)
+        bs = dataset.batch_size
+    vid_path = [None] * bs
+
+    # Run inference, the writer saves csv, txt, images and videos in the background and finishes them on exit or error
+    with ResultWriter(save_dir / "predictions.csv") as writer:
+        model.warmup(imgsz=(1 if pt or model.triton else bs, 3, *imgsz))  # warmup
+        seen, windows, dt = 0, [], (Profile(device=device), Profile(device=device), Profile(device=device))
+        for path, im, im0s, vid_cap, s in dataset:
+            with dt[0]:
+                im = torch.from_numpy(im).to(model.device)
+                im = im.half() if model.fp16 else im.float()  # uint8 to fp16/32
+                im /= 255  # 0 - 255 to 0.0 - 1.0
+                if len(im.shape) == 3:
+                    im = im[None]  # expand for batch dim
+
+            # Inference
+            with dt[1]:
+                stem = Path(path[0] if isinstance(path, list) else path).stem
+                visualize = increment_path(save_dir / stem, mkdir=True) if visualize else False
+                pred = model(im, augment=augment, visualize=visualize, conf_thres=conf_thres if prefilter else None)
+            # NMS
+            with dt[2]:
+                pred = nms(pred, conf_thres, iou_thres, classes, agnostic_nms, max_det=max_det)
+
+            # Second-stage classifier (optional)
+            # pred = utils.general.apply_classifier(pred, classifier_model, im, im0s)
+
+            # Process predictions
+            for i, det in enumerate(pred):  # per image
+                seen += 1
+                if webcam:  # batch_size >= 1
+                    p, im0, frame = path[i], im0s[i].copy(), dataset.count
+                    s += f"{i}: "
+                elif isinstance(path, list):  # batch of images or of consecutive frames of one video
+                    p, im0, frame = path[i], im0s[i].copy(), getattr(dataset, "frame", 0) - len(pred) + 1 + i
+                    s += f"{i}: "
+                else:
+                    p, im0, frame = path, im0s.copy(), getattr(dataset, "frame", 0)
+
+                p = Path(p)  # to Path
+                save_path = str(save_dir / p.name)  # im.jpg
+                txt_path = str(save_dir / "labels" / p.stem)  # im.txt
+                txt_path += "" if dataset.mode == "image" else f"_{frame}"  # im_frame.txt for videos
+                s += "{:g}x{:g} ".format(*im.shape[2:])  # print string
+                gn = torch.tensor(im0.shape)[[1, 0, 1, 0]]  # normalization gain whwh
+                imc = im0.copy() if save_crop else im0  # for save_crop
+                annotator = Annotator(im0, line_width=line_thickness, example=str(names))
+                if len(det):
+                    # Rescale boxes from img_size to im0 size
+                    det[:, :4] = postprocess.scale_boxes(im.shape[2:], det[:, :4], im0.shape).round()
+
+                    # Print results
+                    for c in sorted(set(det[:, 5].tolist())):  # torch or NumPy detections
+                        n = int((det[:, 5] == c).sum())  # detections per class
+                        s += f"{n} {names[int(c)]}{'s' * (n > 1)}, "  # add to string
+
+                    # Write results
+                    csv_rows, txt_lines = [], []
+                    for *xyxy, conf, cls in reversed(det):
                         c = int(cls)  # integer class
-                        label = None if hide_labels else (names[c] if hide_conf else f"{names[c]} {conf:.2f}")
-                        annotator.box_label(xyxy, label, color=colors(c, True))
-                    if save_crop:
-                        save_one_box(xyxy, imc, file=save_dir / "crops" / names[c] / f"{p.stem}.jpg", BGR=True)
-
-            # Stream results
-            im0 = annotator.result()
-            if view_img:
-                if platform.system() == "Linux" and p not in windows:
-                    windows.append(p)
-                    cv2.namedWindow(str(p), cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)  # allow window resize (Linux)
-                    cv2.resizeWindow(str(p), im0.shape[1], im0.shape[0])
-                cv2.imshow(str(p), im0)
-                cv2.waitKey(1)  # 1 millisecond
-
-            # Save results (image with detections)
-            if save_img:
-                if dataset.mode == "image":
-                    cv2.imwrite(save_path, im0)
-                else:  # 'video' or 'stream'
-                    if vid_path[i] != save_path:  # new video
-                        vid_path[i] = save_path
-                        if isinstance(vid_writer[i], cv2.VideoWriter):
-                            vid_writer[i].release()  # release previous video writer
-                        if vid_cap:  # video
-                            fps = vid_cap.get(cv2.CAP_PROP_FPS)
-                            w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                            h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                        else:  # stream
-                            fps, w, h = 30, im0.shape[1], im0.shape[0]
-                        save_path = str(Path(save_path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos
-                        vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
-                    vid_writer[i].write(im0)
-
-        # Print time (inference-only)
-        LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1e3:.1f}ms")
+                        label = names[c] if hide_conf else f"{names[c]}"
+                        confidence = float(conf)
+                        confidence_str = f"{confidence:.2f}"
+
+                        if save_csv:
+                            csv_rows.append((p.name, label, confidence_str))
+
+                        if save_txt:  # Write to file
+                            if save_format == 0:
+                                coords = (
+                                    (xyxy2xywh(torch.tensor(xyxy).view(1, 4)) / gn).view(-1).tolist()
+                                )  # normalized xywh
+                            else:
+                                coords = (torch.tensor(xyxy).view(1, 4) / gn).view(-1).tolist()  # xyxy
+                            line = (cls, *coords, conf) if save_conf else (cls, *coords)  # label format
+                            txt_lines.append(("%g " * len(line)).rstrip() % line)
+
+                        if save_img or save_crop or view_img:  # Add bbox to image
+                            c = int(cls)  # integer class
+                            label = None if hide_labels else (names[c] if hide_conf else f"{names[c]} {conf:.2f}")
+                            annotator.box_label(xyxy, label, color=colors(c, True))
+                        if save_crop:
+                            crop = save_dir / "crops" / names[c] / f"{p.stem}.jpg"
+                            writer.submit(save_one_box, xyxy, imc, file=crop, BGR=True)
+                    if csv_rows:
+                        writer.csv(csv_rows)
+                    if txt_lines:
+                        writer.txt(f"{txt_path}.txt", txt_lines)
+
+                # Stream results
+                im0 = annotator.result()
+                if view_img:
+                    if platform.system() == "Linux" and p not in windows:
+                        windows.append(p)
+                        cv2.namedWindow(str(p), cv2.WINDOW_NORMAL | cv2.WINDOW_KEEPRATIO)  # allow window resize (Linux)
+                        cv2.resizeWindow(str(p), im0.shape[1], im0.shape[0])
+                    cv2.imshow(str(p), im0)
+                    cv2.waitKey(1)  # 1 millisecond
+
+                # Save results (image with detections)
+                if save_img:
+                    if dataset.mode == "image":
+                        writer.image(save_path, im0)
+                    else:  # 'video' or 'stream'
+                        k = i if webcam else 0  # video writer index, a batch of files is from one video
+                        if vid_path[k] != save_path:  # new video
+                            vid_path[k] = save_path
+                            if vid_cap:  # video
+                                fps = vid_cap.get(cv2.CAP_PROP_FPS)
+                                w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                                h = int(vid_cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                            else:  # stream
+                                fps, w, h = 30, im0.shape[1], im0.shape[0]
+                            save_path = str(Path(save_path).with_suffix(".mp4"))  # force *.mp4 suffix on results videos
+                            writer.video_open(k, save_path, fps, (w, h))
+                        writer.video(k, im0)
+
+            # Print time (inference-only)
+            LOGGER.info(f"{s}{'' if len(det) else '(no detections), '}{dt[1].dt * 1e3:.1f}ms")
 
     # Print results
     t = tuple(x.t / seen * 1e3 for x in dt)  # speeds per image
@@ -355,6 +353,10 @@ def parse_opt():
         --dnn (bool, optional): Flag to use OpenCV DNN for ONNX inference. Defaults to False.
         --vid-stride (int, optional): Video frame-rate stride, determining the number of frames to skip in between
             consecutive frames. Defaults to 1.
+        --batch-size (int, optional): Batch size for image and video sources, needs --workers > 0. Defaults to 1.
+        --workers (int, optional): Number of image/frame decode threads, 0 decodes inline. Defaults to 0.
+        --prefilter (bool, optional): Flag to decode only anchors above --conf-thres in the Detect head (PyTorch
+            models). Defaults to False.
 
     Returns:
         argparse.Namespace: Parsed command-line arguments as an argparse.Namespace object.
@@ -400,6 +402,9 @@ def parse_opt():
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
     parser.add_argument("--vid-stride", type=int, default=1, help="video frame-rate stride")
+    parser.add_argument("--batch-size", type=int, default=1, help="batch size for images/videos, needs --workers > 0")
+    parser.add_argument("--workers", type=int, default=0, help="image/frame decode threads, 0 decodes inline")
+    parser.add_argument("--prefilter", action="store_true", help="decode only anchors above --conf-thres in Detect()")
     opt = parser.parse_args()
     opt.imgsz *= 2 if len(opt.imgsz) == 1 else 1  # expand
     print_args(vars(opt))
@@ -56,7 +56,6 @@ import time
 import warnings
 from pathlib import Path
 
-import pandas as pd
 import torch
 from torch.utils.mobile_optimizer import optimize_for_mobile
 
@@ -142,6 +141,22 @@ class iOSModel(torch.nn.Module):
         return cls * conf, xywh * self.normalize  # confidence (3780, 80), coordinates (3780, 4)
 
 
+EXPORT_FORMATS = [
+    ["PyTorch", "-", ".pt", True, True],
+    ["TorchScript", "torchscript", ".torchscript", True, True],
+    ["ONNX", "onnx", ".onnx", True, True],
+    ["OpenVINO", "openvino", "_openvino_model", True, False],
+    ["TensorRT", "engine", ".engine", False, True],
+    ["CoreML", "coreml", ".mlpackage", True, False],
+    ["TensorFlow SavedModel", "saved_model", "_saved_model", True, True],
+    ["TensorFlow GraphDef", "pb", ".pb", True, True],
+    ["TensorFlow Lite", "tflite", ".tflite", True, False],
+    ["TensorFlow Edge TPU", "edgetpu", "_edgetpu.tflite", False, False],
+    ["TensorFlow.js", "tfjs", "_web_model", False, False],
+    ["PaddlePaddle", "paddle", "_paddle_model", True, True],
+]  # Format, Argument, Suffix, CPU, GPU
+
+
 def export_formats():
     r"""
     Returns a DataFrame of supported YOLOv5 model export formats and their properties.
@@ -165,21 +180,9 @@ def export_formats():
         - Supports Training: Whether the format supports training.
         - Supports Detection: Whether the format supports detection.
     """
-    x = [
-        ["PyTorch", "-", ".pt", True, True],
-        ["TorchScript", "torchscript", ".torchscript", True, True],
-        ["ONNX", "onnx", ".onnx", True, True],
-        ["OpenVINO", "openvino", "_openvino_model", True, False],
-        ["TensorRT", "engine", ".engine", False, True],
-        ["CoreML", "coreml", ".mlpackage", True, False],
-        ["TensorFlow SavedModel", "saved_model", "_saved_model", True, True],
-        ["TensorFlow GraphDef", "pb", ".pb", True, True],
-        ["TensorFlow Lite", "tflite", ".tflite", True, False],
-        ["TensorFlow Edge TPU", "edgetpu", "_edgetpu.tflite", False, False],
-        ["TensorFlow.js", "tfjs", "_web_model", False, False],
-        ["PaddlePaddle", "paddle", "_paddle_model", True, True],
-    ]
-    return pd.DataFrame(x, columns=["Format", "Argument", "Suffix", "CPU", "GPU"])
+    import pandas as pd  # imported here to keep pandas off the inference import path
+
+    return pd.DataFrame(EXPORT_FORMATS, columns=["Format", "Argument", "Suffix", "CPU", "GPU"])
 
 
 def try_export(inner_func):
@@ -6,6 +6,7 @@ import contextlib
 import json
 import math
 import platform
+import threading
 import warnings
 import zipfile
 from collections import OrderedDict, namedtuple
@@ -15,7 +16,6 @@ from urllib.parse import urlparse
 
 import cv2
 import numpy as np
-import pandas as pd
 import requests
 import torch
 import torch.nn as nn
@@ -36,7 +36,8 @@ except (ImportError, AssertionError):
 from ultralytics.utils.plotting import Annotator, colors, save_one_box
 
 from utils import TryExcept
-from utils.dataloaders import exif_transpose, letterbox
+from utils.augmentations import letterbox_into
+from utils.dataloaders import exif_transpose
 from utils.general import (
     LOGGER,
     ROOT,
@@ -49,6 +50,7 @@ from utils.general import (
     is_jupyter,
     make_divisible,
     non_max_suppression,
+    non_max_suppression_candidates,
     scale_boxes,
     xywh2xyxy,
     xyxy2xywh,
@@ -459,8 +461,28 @@ class Concat(nn.Module):
 class DetectMultiBackend(nn.Module):
     """YOLOv5 MultiBackend class for inference on various backends including PyTorch, ONNX, TensorRT, and more."""
 
-    def __init__(self, weights="yolov5s.pt", device=torch.device("cpu"), dnn=False, data=None, fp16=False, fuse=True):
-        """Initializes DetectMultiBackend with support for various inference backends, including PyTorch and ONNX."""
+    def __init__(
+        self,
+        weights="yolov5s.pt",
+        device=torch.device("cpu"),
+        dnn=False,
+        data=None,
+        fp16=False,
+        fuse=True,
+        numpy_outputs=False,
+        io_binding=False,
+        ort_options=None,
+    ):
+        """
+        Initializes DetectMultiBackend with support for various inference backends, including PyTorch and ONNX.
+
+        `numpy_outputs` returns NumPy runtime outputs as-is instead of torch tensors, for use with
+        utils.postprocess.select_postprocess().
+
+        ONNX Runtime only: `io_binding` runs on persistent input and output buffers bound once per input shape and
+        returns views of the output buffers, which the next call overwrites. `ort_options` sets SessionOptions
+        attributes, e.g. {'intra_op_num_threads': 4, 'inter_op_num_threads': 1, 'execution_mode': 'parallel'}.
+        """
         #   PyTorch:              weights = *.pt
         #   TorchScript:                    *.torchscript
         #   ONNX Runtime:                   *.onnx
@@ -512,8 +534,15 @@ class DetectMultiBackend(nn.Module):
             import onnxruntime
 
             providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if cuda else ["CPUExecutionProvider"]
-            session = onnxruntime.InferenceSession(w, providers=providers)
+            session_options = onnxruntime.SessionOptions()
+            for k, v in (ort_options or {}).items():
+                if k == "execution_mode" and isinstance(v, str):  # 'sequential' or 'parallel'
+                    v = getattr(onnxruntime.ExecutionMode, f"ORT_{v.upper()}")
+                setattr(session_options, k, v)
+            session = onnxruntime.InferenceSession(w, sess_options=session_options, providers=providers)
             output_names = [x.name for x in session.get_outputs()]
+            ort_cuda = session.get_providers()[0] == "CUDAExecutionProvider"
+            ort_binding = None  # (input shape, IOBinding, input buffer, output buffers) for io_binding
             meta = session.get_modelmeta().custom_metadata_map  # metadata
             if "stride" in meta:
                 stride, names = int(meta["stride"]), eval(meta["names"])
@@ -532,6 +561,7 @@ class DetectMultiBackend(nn.Module):
             if batch_dim.is_static:
                 batch_size = batch_dim.get_length()
             ov_compiled_model = core.compile_model(ov_model, device_name="AUTO")  # AUTO selects best available device
+            ov_queue = None  # AsyncInferQueue for batches larger than a static batch dimension, created on first use
             stride, names = self._load_metadata(Path(w).with_suffix(".yaml"))  # load metadata
         elif engine:  # TensorRT
             LOGGER.info(f"Loading {w} for TensorRT inference...")
@@ -676,8 +706,10 @@ class DetectMultiBackend(nn.Module):
 
         self.__dict__.update(locals())  # assign all variables to self
 
-    def forward(self, im, augment=False, visualize=False):
-        """Performs YOLOv5 inference on input images with options for augmentation and visualization."""
+    def forward(self, im, augment=False, visualize=False, conf_thres=None):
+        """Performs YOLOv5 inference on input images with options for augmentation and visualization; PyTorch models
+        given `conf_thres` return per-image candidates decoded by Detect() above it.
+        """
         b, ch, h, w = im.shape  # batch, channel, height, width
         if self.fp16 and im.dtype != torch.float16:
             im = im.half()  # to FP16
@@ -685,7 +717,10 @@ class DetectMultiBackend(nn.Module):
             im = im.permute(0, 2, 3, 1)  # torch BCHW to numpy BHWC shape(1,320,192,3)
 
         if self.pt:  # PyTorch
-            y = self.model(im, augment=augment, visualize=visualize) if augment or visualize else self.model(im)
+            if augment or visualize or conf_thres is not None:
+                y = self.model(im, augment=augment, visualize=visualize, conf_thres=conf_thres)
+            else:
+                y = self.model(im)
         elif self.jit:  # TorchScript
             y = self.model(im)
         elif self.dnn:  # ONNX OpenCV DNN
@@ -693,11 +728,17 @@ class DetectMultiBackend(nn.Module):
             self.net.setInput(im)
             y = self.net.forward()
         elif self.onnx:  # ONNX Runtime
-            im = im.cpu().numpy()  # torch to numpy
-            y = self.session.run(self.output_names, {self.session.get_inputs()[0].name: im})
+            if self.io_binding:
+                y = self._onnx_io_binding(im)
+            else:
+                im = im.cpu().numpy()  # torch to numpy
+                y = self.session.run(self.output_names, {self.session.get_inputs()[0].name: im})
         elif self.xml:  # OpenVINO
             im = im.cpu().numpy()  # FP32
-            y = list(self.ov_compiled_model(im).values())
+            if self.batch_dim.is_static and b != self.batch_size:
+                y = self._openvino_async(im)
+            else:
+                y = list(self.ov_compiled_model(im).values())
         elif self.engine:  # TensorRT
             if self.dynamic and im.shape != self.bindings["images"].shape:
                 i = self.model.get_binding_index("images")
@@ -760,9 +801,58 @@ class DetectMultiBackend(nn.Module):
         else:
             return self.from_numpy(y)
 
+    def _onnx_io_binding(self, im):
+        """Runs ONNX Runtime on input/output buffers bound once per input shape, returns views of the output buffers."""
+        device = torch.device("cuda", self.device.index or 0) if self.ort_cuda else torch.device("cpu")
+        if self.ort_binding is None or self.ort_binding[0] != im.shape:
+            name = self.session.get_inputs()[0].name
+            x = im.to(device, copy=True).contiguous()  # input buffer
+            xn = x.cpu().numpy()
+            outputs = self.session.run(self.output_names, {name: xn})  # output shapes and dtypes
+            y = [torch.from_numpy(o).to(device) for o in outputs]  # output buffers
+            binding = self.session.io_binding()
+            index = device.index or 0
+            binding.bind_input(name, device.type, index, xn.dtype, list(x.shape), x.data_ptr())
+            for n, o, b in zip(self.output_names, outputs, y):
+                binding.bind_output(n, device.type, index, o.dtype, list(b.shape), b.data_ptr())
+            self.ort_binding = im.shape, binding, x, y
+        _, binding, x, y = self.ort_binding
+        x.copy_(im)
+        if self.ort_cuda:
+            torch.cuda.synchronize(device)  # input copy runs on the torch stream
+        self.session.run_with_iobinding(binding)
+        if self.numpy_outputs and not self.ort_cuda:
+            return [b.numpy() for b in y]  # zero-copy
+        return [b.to(self.device) for b in y]
+
+    def _openvino_async(self, im):
+        """Runs a batch through a static-batch OpenVINO model as parallel infer requests of `batch_size` images each."""
+        if self.ov_queue is None:
+            from openvino.runtime import AsyncInferQueue
+
+            # THROUGHPUT hint: several CPU streams, so that parallel requests scale with the available cores
+            self.ov_compiled_model = self.core.compile_model(self.ov_model, "AUTO", {"PERFORMANCE_HINT": "THROUGHPUT"})
+            self.ov_queue = AsyncInferQueue(self.ov_compiled_model)  # optimal number of infer requests
+        n, bs = im.shape[0], self.batch_size
+        pad = -n % bs  # zero-pad the last request to the static batch size
+        if pad:
+            im = np.concatenate((im, np.zeros((pad, *im.shape[1:]), dtype=im.dtype)))
+
+        y = [None] * (len(im) // bs)
+
+        def done(request, i):
+            """Copies the outputs of request `i` before the request is reused."""
+            y[i] = [request.get_output_tensor(j).data.copy() for j in range(len(request.model_outputs))]
+
+        self.ov_queue.set_callback(done)
+        for i in range(len(y)):
+            self.ov_queue.start_async(im[i * bs : (i + 1) * bs], i)
+        self.ov_queue.wait_all()
+        return [np.concatenate(x)[:n] for x in zip(*y)]
+
     def from_numpy(self, x):
         """Converts a NumPy array to a torch tensor, maintaining device compatibility."""
-        return torch.from_numpy(x).to(self.device) if isinstance(x, np.ndarray) else x
+        return torch.from_numpy(x).to(self.device) if isinstance(x, np.ndarray) and not self.numpy_outputs else x
 
     def warmup(self, imgsz=(1, 3, 640, 640)):
         """Performs a single inference warmup to initialize model weights, accepting an `imgsz` tuple for image size."""
@@ -780,10 +870,10 @@ class DetectMultiBackend(nn.Module):
         Example: path='path/to/model.onnx' -> type=onnx
         """
         # types = [pt, jit, onnx, xml, engine, coreml, saved_model, pb, tflite, edgetpu, tfjs, paddle]
-        from export import export_formats
+        from export import EXPORT_FORMATS
         from utils.downloads import is_url
 
-        sf = list(export_formats().Suffix)  # export suffixes
+        sf = [x[2] for x in EXPORT_FORMATS]  # export suffixes
         if not is_url(p, check=False):
             check_suffix(p, sf)  # checks
         url = urlparse(p)  # if url may be Triton inference server
@@ -801,6 +891,54 @@ class DetectMultiBackend(nn.Module):
         return None, None
 
 
+class PreprocessBuffers:
+    """Preallocated host and device input buffers for one AutoShape batch size, inference shape, device and dtype."""
+
+    def __init__(self, n, shape, device, dtype):
+        """Allocates a (pinned, on CUDA) uint8 BHWC host buffer and the BCHW model input tensor it is converted into."""
+        cuda = device.type == "cuda"
+        self.host = torch.empty((n, *shape, 3), dtype=torch.uint8, pin_memory=cuda)  # BHWC uint8
+        self.staging = torch.empty_like(self.host, device=device) if cuda else self.host  # BHWC uint8 on device
+        self.input = torch.empty((n, 3, *shape), dtype=dtype, device=device)  # BCHW fp16/32
+
+    def load(self, ims):
+        """Letterboxes `ims` into the host buffer and converts it to the model input in a single fused pass."""
+        host = self.host.numpy()
+        for i, im in enumerate(ims):
+            letterbox_into(im, host[i])
+        if self.staging is not self.host:
+            self.staging.copy_(self.host, non_blocking=True)
+        return torch.div(self.staging.permute(0, 3, 1, 2), 255, out=self.input)  # BHWC to BCHW, uint8 to fp16/32
+
+
+class Preprocessor:
+    """Pool of PreprocessBuffers reused across AutoShape calls so steady-state preprocessing allocates nothing."""
+
+    def __init__(self, max_shapes=8):
+        """Keeps free buffers for up to `max_shapes` distinct (batch, shape, device, dtype) keys, least recent first."""
+        self.max_shapes = max_shapes
+        self.pool = OrderedDict()  # key -> list of free PreprocessBuffers
+        self.lock = threading.Lock()
+
+    def acquire(self, n, shape, device, dtype):
+        """Returns free buffers for this key, allocating new ones if all are in use (e.g. concurrent requests)."""
+        key = (n, *shape, str(device), dtype)
+        with self.lock:
+            free = self.pool.pop(key, [])
+            buffers = free.pop() if free else None
+            self.pool[key] = free  # most recently used
+            while len(self.pool) > self.max_shapes:
+                self.pool.popitem(last=False)
+        return buffers or PreprocessBuffers(n, shape, device, dtype)
+
+    def release(self, buffers):
+        """Returns buffers to the pool once the model is done reading their input tensor."""
+        key = (buffers.host.shape[0], *buffers.host.shape[1:3], str(buffers.input.device), buffers.input.dtype)
+        with self.lock:
+            if key in self.pool:
+                self.pool[key].append(buffers)
+
+
 class AutoShape(nn.Module):
     """AutoShape class for robust YOLOv5 inference with preprocessing, NMS, and support for various input formats."""
 
@@ -810,6 +948,8 @@ class AutoShape(nn.Module):
     multi_label = False  # NMS multiple labels per box
     classes = None  # (optional list) filter by class, i.e. = [0, 15, 16] for COCO persons, cats and dogs
     max_det = 1000  # maximum number of detections per image
+    batched = True  # NMS the whole batch in one pass
+    prefilter = False  # PyTorch models: Detect() decodes only anchors above `conf` for image inputs
     amp = False  # Automatic Mixed Precision (AMP) inference
 
     def __init__(self, model, verbose=True):
@@ -825,6 +965,7 @@ class AutoShape(nn.Module):
             m = self.model.model.model[-1] if self.dmb else self.model.model[-1]  # Detect()
             m.inplace = False  # Detect.inplace=False for safe multithread inference
             m.export = True  # do not output loss values
+        self.preprocessor = Preprocessor()  # reusable letterbox and input buffers
 
     def _apply(self, fn):
         """
@@ -863,6 +1004,7 @@ class AutoShape(nn.Module):
                 size = (size, size)
             p = next(self.model.parameters()) if self.pt else torch.empty(1, device=self.model.device)  # param
             autocast = self.amp and (p.device.type != "cpu")  # Automatic Mixed Precision (AMP) inference
+            prefilter = self.prefilter and self.pt and not augment  # augmented inference needs the full output
             if isinstance(ims, torch.Tensor):  # torch
                 with amp.autocast(autocast):
                     return self.model(ims.to(p.device).type_as(p), augment=augment)  # inference
@@ -887,52 +1029,89 @@ class AutoShape(nn.Module):
                 shape1.append([int(y * g) for y in s])
                 ims[i] = im if im.data.contiguous else np.ascontiguousarray(im)  # update
             shape1 = [make_divisible(x, self.stride) for x in np.array(shape1).max(0)]  # inf shape
-            x = [letterbox(im, shape1, auto=False)[0] for im in ims]  # pad
-            x = np.ascontiguousarray(np.array(x).transpose((0, 3, 1, 2)))  # stack and BHWC to BCHW
-            x = torch.from_numpy(x).to(p.device).type_as(p) / 255  # uint8 to fp16/32
-
-        with amp.autocast(autocast):
-            # Inference
-            with dt[1]:
-                y = self.model(x, augment=augment)  # forward
-
-            # Post-process
-            with dt[2]:
-                y = non_max_suppression(
-                    y if self.dmb else y[0],
-                    self.conf,
-                    self.iou,
-                    self.classes,
-                    self.agnostic,
-                    self.multi_label,
-                    max_det=self.max_det,
-                )  # NMS
-                for i in range(n):
-                    scale_boxes(shape1, y[i][:, :4], shape0[i])
-
-            return Detections(ims, y, files, dt, self.names, x.shape)
+            buffers = self.preprocessor.acquire(n, shape1, p.device, p.dtype)
+            x = buffers.load(ims)  # letterbox, BHWC to BCHW and uint8 to fp16/32 into preallocated buffers
+
+        try:
+            with amp.autocast(autocast):
+                # Inference
+                with dt[1]:
+                    y = self.model(x, augment=augment, conf_thres=self.conf if prefilter else None)  # forward
+
+                # Post-process
+                with dt[2]:
+                    nms = non_max_suppression_candidates if prefilter else non_max_suppression
+                    y = nms(
+                        y if self.dmb else y[0],
+                        self.conf,
+                        self.iou,
+                        self.classes,
+                        self.agnostic,
+                        self.multi_label,
+                        max_det=self.max_det,
+                        batched=self.batched,
+                    )  # NMS
+                    for i in range(n):
+                        scale_boxes(shape1, y[i][:, :4], shape0[i])
+
+                return Detections(ims, y, files, dt, self.names, x.shape)
+        finally:
+            self.preprocessor.release(buffers)
 
 
 class Detections:
     """Manages YOLOv5 detection results with methods for visualization, saving, cropping, and exporting detections."""
 
+    COLUMNS = {
+        "xyxy": ("xmin", "ymin", "xmax", "ymax", "confidence", "class", "name"),
+        "xywh": ("xcenter", "ycenter", "width", "height", "confidence", "class", "name"),
+    }
+
     def __init__(self, ims, pred, files, times=(0, 0, 0), names=None, shape=None):
         """Initializes the YOLOv5 Detections class with image info, predictions, filenames, timing and normalization."""
         super().__init__()
-        d = pred[0].device  # device
-        gn = [torch.tensor([*(im.shape[i] for i in [1, 0, 1, 0]), 1, 1], device=d) for im in ims]  # normalizations
         self.ims = ims  # list of images as numpy arrays
         self.pred = pred  # list of tensors pred[0] = (xyxy, conf, cls)
         self.names = names  # class names
         self.files = files  # image filenames
         self.times = times  # profiling times
-        self.xyxy = pred  # xyxy pixels
-        self.xywh = [xyxy2xywh(x) for x in pred]  # xywh pixels
-        self.xyxyn = [x / g for x, g in zip(self.xyxy, gn)]  # xyxy normalized
-        self.xywhn = [x / g for x, g in zip(self.xywh, gn)]  # xywh normalized
+        self._views = {"xyxy": pred}  # box formats, the others are computed on first access
         self.n = len(self.pred)  # number of images (batch size)
         self.t = tuple(x.t / self.n * 1e3 for x in times)  # timestamps (ms)
         self.s = tuple(shape)  # inference BCHW shape
+        self._exports = {}  # cached to_numpy()/to_dict() results
+
+    @property
+    def xyxy(self):
+        """Returns per-image xyxy pixel boxes [x1, y1, x2, y2, conf, cls], i.e. `pred`."""
+        return self._view("xyxy")
+
+    @property
+    def xywh(self):
+        """Returns per-image xywh pixel boxes [x, y, w, h, conf, cls]."""
+        return self._view("xywh")
+
+    @property
+    def xyxyn(self):
+        """Returns per-image xyxy boxes normalized by image width and height."""
+        return self._view("xyxyn")
+
+    @property
+    def xywhn(self):
+        """Returns per-image xywh boxes normalized by image width and height."""
+        return self._view("xywhn")
+
+    def _view(self, k):
+        """Computes box format `k` for the whole batch in one op on first access, then returns the cached result."""
+        if k not in self._views:
+            x = torch.cat(self.pred)
+            if k.startswith("xywh"):
+                x = xyxy2xywh(x)
+            if k.endswith("n"):
+                gn = torch.tensor([[*(im.shape[i] for i in [1, 0, 1, 0]), 1, 1] for im in self.ims])  # normalizations
+                x = x / gn.repeat_interleave(torch.tensor([len(p) for p in self.pred]), 0).to(x.device)
+            self._views[k] = list(x.split([len(p) for p in self.pred]))
+        return self._views[k]
 
     def _run(self, pprint=False, show=False, save=False, crop=False, render=False, labels=True, save_dir=Path("")):
         """Executes model predictions, displaying and/or saving outputs with optional crops and labels."""
@@ -1026,14 +1205,93 @@ class Detections:
 
         Example: print(results.pandas().xyxy[0]).
         """
+        import pandas as pd  # imported here to keep pandas off the inference import path
+
+        pd.options.display.max_columns = 10
         new = copy(self)  # return copy
-        ca = "xmin", "ymin", "xmax", "ymax", "confidence", "class", "name"  # xyxy columns
-        cb = "xcenter", "ycenter", "width", "height", "confidence", "class", "name"  # xywh columns
-        for k, c in zip(["xyxy", "xyxyn", "xywh", "xywhn"], [ca, ca, cb, cb]):
-            a = [[x[:5] + [int(x[5]), self.names[int(x[5])]] for x in x.tolist()] for x in getattr(self, k)]  # update
-            setattr(new, k, [pd.DataFrame(x, columns=c) for x in a])
+        new._views = {
+            k: [pd.DataFrame(x, columns=self.COLUMNS[k[:4]]) for x in self.to_dict(k)]
+            for k in ("xyxy", "xyxyn", "xywh", "xywhn")
+        }
         return new
 
+    def to_numpy(self, format="xyxy"):
+        """
+        Returns a list of per-image (n, 6) float32 arrays [box, confidence, class] in box `format` (xyxy, xyxyn, xywh or
+        xywhn), computed with a single device-to-host copy on first use and cached.
+
+        Example: boxes = results.to_numpy('xywhn')[0][:, :4].
+        """
+        key = "numpy", format
+        if key not in self._exports:
+            assert format in ("xyxy", "xyxyn", "xywh", "xywhn"), f"invalid box format '{format}'"
+            x = getattr(self, format)
+            a = torch.cat(x).float().cpu().numpy()
+            self._exports[key] = np.split(a, np.cumsum([len(d) for d in x])[:-1])
+        return self._exports[key]
+
+    def to_dict(self, format="xyxy", orient="records"):
+        """
+        Returns detections per image as a list of records (orient='records') or as a dict of column lists
+        (orient='list'), the same as pandas().<format>[i].to_dict(orient) without pandas.
+
+        Example: for d in results.to_dict()[0]: print(d['name'], d['confidence']).
+        """
+        key = "dict", format, orient
+        if key not in self._exports:
+            assert orient in ("records", "list"), f"invalid orient '{orient}', valid values are 'records' and 'list'"
+            columns = self.COLUMNS[format[:4]]
+            out = []
+            for a in self.to_numpy(format):
+                c = a[:, 5].astype(np.int64)
+                values = [*a[:, :5].T.tolist(), c.tolist(), self._names_array()[c].tolist()]
+                out.append(
+                    dict(zip(columns, values))
+                    if orient == "list"
+                    else [dict(zip(columns, row)) for row in zip(*values)]
+                )
+            self._exports[key] = out
+        return self._exports[key]
+
+    def to_json(self, format="xyxy", orient="records"):
+        """
+        Returns detections as one JSON string per image, e.g. a REST API response body, `orient` as in to_dict():
+        a list of records ('records') or an object of column lists ('list').
+
+        Example: body = results.to_json()[0].
+        """
+        key = "json", format, orient
+        if key not in self._exports:
+            self._exports[key] = [json.dumps(x) for x in self.to_dict(format, orient)]
+        return self._exports[key]
+
+    def to_arrow(self, format="xyxy"):
+        """
+        Returns all detections of the batch as one pyarrow.RecordBatch with an 'image' index column followed by the
+        to_dict() columns, for Arrow IPC, Parquet or Flight consumers. Requires pyarrow.
+
+        Example: batch = results.to_arrow(); table = pyarrow.Table.from_batches([batch]).
+        """
+        import pyarrow as pa
+
+        x = self.to_numpy(format)
+        a = np.concatenate(x)
+        c = a[:, 5].astype(np.int64)
+        arrays = [pa.array(np.repeat(np.arange(self.n, dtype=np.int32), [len(d) for d in x]))]
+        arrays += [pa.array(a[:, i]) for i in range(5)]
+        arrays += [pa.array(c), pa.array(self._names_array()[c].tolist(), type=pa.string())]
+        return pa.RecordBatch.from_arrays(arrays, names=["image", *self.COLUMNS[format[:4]]])
+
+    def _names_array(self):
+        """Returns class names as a cached object array so class indices map to names in one fancy-indexing op."""
+        if "names" not in self._exports:
+            names = self.names if isinstance(self.names, dict) else dict(enumerate(self.names))
+            a = np.empty(max(names, default=-1) + 1, dtype=object)
+            for k, v in names.items():
+                a[k] = v
+            self._exports["names"] = a
+        return self._exports["names"]
+
     def tolist(self):
         """
         Converts a Detections object into a list of individual detection results for iteration.
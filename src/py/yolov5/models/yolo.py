@@ -89,8 +89,10 @@ class Detect(nn.Module):
         self.m = nn.ModuleList(nn.Conv2d(x, self.no * self.na, 1) for x in ch)  # output conv
         self.inplace = inplace  # use inplace ops (e.g. slice assignment)
 
-    def forward(self, x):
-        """Processes input through YOLOv5 layers, altering shape for detection: `x(bs, 3, ny, nx, 85)`."""
+    def forward(self, x, conf_thres=None):
+        """Processes input through YOLOv5 layers, altering shape for detection: `x(bs, 3, ny, nx, 85)`; at inference
+        `conf_thres` decodes only anchors with objectness above it and returns per-image candidates.
+        """
         z = []  # inference output
         for i in range(self.nl):
             x[i] = self.m[i](x[i])  # conv
@@ -101,6 +103,9 @@ class Detect(nn.Module):
                 if self.dynamic or self.grid[i].shape[2:4] != x[i].shape[2:4]:
                     self.grid[i], self.anchor_grid[i] = self._make_grid(nx, ny, i)
 
+                if conf_thres is not None:  # candidates only
+                    z.append(self._decode_candidates(x[i], i, conf_thres))
+                    continue
                 if isinstance(self, Segment):  # (boxes + masks)
                     xy, wh, conf, mask = x[i].split((2, 2, self.nc + 1, self.no - self.nc - 5), 4)
                     xy = (xy.sigmoid() * 2 + self.grid[i]) * self.stride[i]  # xy
@@ -113,8 +118,35 @@ class Detect(nn.Module):
                     y = torch.cat((xy, wh, conf), 4)
                 z.append(y.view(bs, self.na * nx * ny, self.no))
 
+        if conf_thres is not None and not self.training:
+            z = self._split_candidates(z, bs)
+            return (z,) if self.export else (z, x)
         return x if self.training else (torch.cat(z, 1),) if self.export else (torch.cat(z, 1), x)
 
+    def _decode_candidates(self, x, i, conf_thres):
+        """Applies sigmoid to the objectness of level `i` only, then decodes the anchors above `conf_thres`; returns
+        (image index, rows) with rows laid out like the full inference output.
+        """
+        b, a, gy, gx = (x[..., 4].sigmoid() > conf_thres).nonzero(as_tuple=True)  # anchor order
+        x = x[b, a, gy, gx]  # (n, no)
+        grid, anchor_grid = self.grid[i][0, a, gy, gx], self.anchor_grid[i][0, a, gy, gx]
+        if isinstance(self, Segment):  # (boxes + masks)
+            xy, wh, conf, mask = x.split((2, 2, self.nc + 1, self.no - self.nc - 5), 1)
+            xy = (xy.sigmoid() * 2 + grid) * self.stride[i]  # xy
+            wh = (wh.sigmoid() * 2) ** 2 * anchor_grid  # wh
+            return b, torch.cat((xy, wh, conf.sigmoid(), mask), 1)
+        xy, wh, conf = x.sigmoid().split((2, 2, self.nc + 1), 1)
+        xy = (xy * 2 + grid) * self.stride[i]  # xy
+        wh = (wh * 2) ** 2 * anchor_grid  # wh
+        return b, torch.cat((xy, wh, conf), 1)
+
+    @staticmethod
+    def _split_candidates(z, bs):
+        """Groups the (image index, rows) candidates of all levels into a list of (n, no) tensors, one per image."""
+        b, y = (torch.cat(v) for v in zip(*z))
+        i = torch.sort(b, stable=True)[1]  # per image, in level then anchor order like the full output
+        return list(y[i].split(torch.bincount(b, minlength=bs).tolist()))
+
     def _make_grid(self, nx=20, ny=20, i=0, torch_1_10=check_version(torch.__version__, "1.10.0")):
         """Generates a mesh grid for anchor boxes with optional compatibility for torch versions < 1.10."""
         d = self.anchors[i].device
@@ -140,12 +172,12 @@ class Segment(Detect):
         self.proto = Proto(ch[0], self.npr, self.nm)  # protos
         self.detect = Detect.forward
 
-    def forward(self, x):
+    def forward(self, x, conf_thres=None):
         """Processes input through the network, returning detections and prototypes; adjusts output based on
         training/export mode.
         """
         p = self.proto(x[0])
-        x = self.detect(self, x)
+        x = self.detect(self, x, conf_thres)
         return (x, p) if self.training else (x[0], p) if self.export else (x[0], p, x[1])
 
 
@@ -158,15 +190,17 @@ class BaseModel(nn.Module):
         """
         return self._forward_once(x, profile, visualize)  # single-scale inference, train
 
-    def _forward_once(self, x, profile=False, visualize=False):
-        """Performs a forward pass on the YOLOv5 model, enabling profiling and feature visualization options."""
+    def _forward_once(self, x, profile=False, visualize=False, conf_thres=None):
+        """Performs a forward pass on the YOLOv5 model, enabling profiling and feature visualization options;
+        `conf_thres` is passed to the Detect() head.
+        """
         y, dt = [], []  # outputs
         for m in self.model:
             if m.f != -1:  # if not from previous layer
                 x = y[m.f] if isinstance(m.f, int) else [x if j == -1 else y[j] for j in m.f]  # from earlier layers
             if profile:
                 self._profile_one_layer(m, x, dt)
-            x = m(x)  # run
+            x = m(x, conf_thres) if conf_thres is not None and isinstance(m, Detect) else m(x)  # run
             y.append(x if m.i in self.save else None)  # save output
             if visualize:
                 feature_visualization(x, m.type, m.i, save_dir=visualize)
@@ -263,11 +297,13 @@ class DetectionModel(BaseModel):
         self.info()
         LOGGER.info("")
 
-    def forward(self, x, augment=False, profile=False, visualize=False):
-        """Performs single-scale or augmented inference and may include profiling or visualization."""
+    def forward(self, x, augment=False, profile=False, visualize=False, conf_thres=None):
+        """Performs single-scale or augmented inference and may include profiling or visualization; `conf_thres`
+        returns per-image candidates above it from single-scale inference.
+        """
         if augment:
             return self._forward_augment(x)  # augmented inference, None
-        return self._forward_once(x, profile, visualize)  # single-scale inference, train
+        return self._forward_once(x, profile, visualize, conf_thres)  # single-scale inference, train
 
     def _forward_augment(self, x):
         """Performs augmented inference across different scales and flips, returning combined detections."""
@@ -61,7 +61,7 @@ from utils.general import (
     xywh2xyxy,
     xyxy2xywh,
 )
-from utils.metrics import ConfusionMatrix, box_iou
+from utils.metrics import ConfusionMatrix, box_iou, match_predictions
 from utils.plots import output_to_target, plot_val_study
 from utils.segment.dataloaders import create_dataloader
 from utils.segment.general import mask_iou, process_mask, process_mask_native, scale_image
@@ -136,19 +136,8 @@ def process_batch(detections, labels, iouv, pred_masks=None, gt_masks=None, over
     else:  # boxes
         iou = box_iou(labels[:, 1:], detections[:, :4])
 
-    correct = np.zeros((detections.shape[0], iouv.shape[0])).astype(bool)
     correct_class = labels[:, 0:1] == detections[:, 5]
-    for i in range(len(iouv)):
-        x = torch.where((iou >= iouv[i]) & correct_class)  # IoU > threshold and classes match
-        if x[0].shape[0]:
-            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()  # [label, detect, iou]
-            if x[0].shape[0] > 1:
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                # matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
-            correct[matches[:, 1].astype(int), i] = True
-    return torch.tensor(correct, dtype=torch.bool, device=iouv.device)
+    return match_predictions(iou, correct_class, iouv)
 
 
 @smart_inference_mode()
@@ -175,6 +164,8 @@ def run(
     exist_ok=False,  # existing project/name ok, do not increment
     half=True,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
+    topk_nms=False,  # select NMS candidates with torch.topk instead of a full sort
+    max_per_class=None,  # (optional) maximum NMS candidates per class and image
     model=None,
     dataloader=None,
     save_dir=Path(""),
@@ -307,10 +298,21 @@ def run(
         lb = [targets[targets[:, 0] == i, 1:] for i in range(nb)] if save_hybrid else []  # for autolabelling
         with dt[2]:
             preds = non_max_suppression(
-                preds, conf_thres, iou_thres, labels=lb, multi_label=True, agnostic=single_cls, max_det=max_det, nm=nm
+                preds,
+                conf_thres,
+                iou_thres,
+                labels=lb,
+                multi_label=True,
+                agnostic=single_cls,
+                max_det=max_det,
+                topk=topk_nms,
+                max_per_class=max_per_class,
+                nm=nm,
+                batched=True,
             )
 
         # Metrics
+        cm_preds, cm_labels = [], []  # confusion matrix inputs, updated once per batch
         plot_masks = []  # masks for plotting
         for si, (pred, proto) in enumerate(zip(preds, protos)):
             labels = targets[targets[:, 0] == si, 1:]
@@ -346,7 +348,8 @@ def run(
                 correct_bboxes = process_batch(predn, labelsn, iouv)
                 correct_masks = process_batch(predn, labelsn, iouv, pred_masks, gt_masks, overlap=overlap, masks=True)
                 if plots:
-                    confusion_matrix.process_batch(predn, labelsn)
+                    cm_preds.append(predn)
+                    cm_labels.append(labelsn)
             stats.append((correct_masks, correct_bboxes, pred[:, 4], pred[:, 5], labels[:, 0]))  # (conf, pcls, tcls)
 
             pred_masks = torch.as_tensor(pred_masks, dtype=torch.uint8)
@@ -362,6 +365,8 @@ def run(
                 )
                 save_one_json(predn, jdict, path, class_map, pred_masks)  # append to COCO-JSON dictionary
             # callbacks.run('on_val_image_end', pred, predn, path, names, im[si])
+        if cm_preds:
+            confusion_matrix.process_batch(cm_preds, cm_labels)
 
         # Plot images
         if plots and batch_i < 3:
@@ -473,6 +478,8 @@ def parse_opt():
     parser.add_argument("--exist-ok", action="store_true", help="existing project/name ok, do not increment")
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
+    parser.add_argument("--topk-nms", action="store_true", help="select NMS candidates with topk instead of sorting")
+    parser.add_argument("--max-per-class", type=int, default=None, help="maximum NMS candidates per class and image")
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
     # opt.save_json |= opt.data.endswith('coco.yaml')
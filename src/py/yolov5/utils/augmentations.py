@@ -152,6 +152,33 @@ def letterbox(im, new_shape=(640, 640), color=(114, 114, 114), auto=True, scaleF
     return im, ratio, (dw, dh)
 
 
+def letterbox_into(im, out, color=(114, 114, 114)):
+    """
+    Letterboxes `im` straight into the preallocated HWC uint8 array `out` (a view into a batch buffer is fine).
+
+    Matches letterbox(im, out.shape[:2], auto=False) without allocating the resized or padded intermediates; returns
+    ratio and padding.
+    """
+    shape = im.shape[:2]  # current shape [height, width]
+    new_shape = out.shape[:2]
+    r = min(new_shape[0] / shape[0], new_shape[1] / shape[1])
+    new_unpad = int(round(shape[1] * r)), int(round(shape[0] * r))
+    dw, dh = (new_shape[1] - new_unpad[0]) / 2, (new_shape[0] - new_unpad[1]) / 2  # wh padding per side
+    top, left = int(round(dh - 0.1)), int(round(dw - 0.1))
+    bottom, right = top + new_unpad[1], left + new_unpad[0]
+
+    out[:top] = color  # border
+    out[bottom:] = color
+    out[top:bottom, :left] = color
+    out[top:bottom, right:] = color
+    roi = out[top:bottom, left:right]
+    if shape[::-1] != new_unpad:  # resize
+        cv2.resize(im, new_unpad, dst=roi, interpolation=cv2.INTER_LINEAR)
+    else:
+        roi[:] = im
+    return (r, r), (dw, dh)
+
+
 def random_perspective(
     im, targets=(), segments=(), degrees=10, translate=0.1, scale=0.1, shear=10, perspective=0.0, border=(0, 0)
 ):
@@ -1,7 +1,9 @@
 # Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
 """Dataloaders and dataset utils."""
 
+import atexit
 import contextlib
+import copy
 import glob
 import hashlib
 import json
@@ -9,8 +11,11 @@ import math
 import os
 import random
 import shutil
+import sys
 import time
-from itertools import repeat
+from collections import deque
+from itertools import count, repeat
+from multiprocessing import resource_tracker, shared_memory
 from multiprocessing.pool import Pool, ThreadPool
 from pathlib import Path
 from threading import Thread
@@ -23,7 +28,7 @@ import torch.nn.functional as F
 import torchvision
 import yaml
 from PIL import ExifTags, Image, ImageOps
-from torch.utils.data import DataLoader, Dataset, dataloader, distributed
+from torch.utils.data import DataLoader, Dataset, IterableDataset, dataloader, distributed
 from tqdm import tqdm
 
 from utils.augmentations import (
@@ -80,6 +85,17 @@ def get_hash(paths):
     return h.hexdigest()  # return hash
 
 
+def get_fingerprints(*files):
+    """Returns (n, 2 * len(files)) int64 (mtime_ns, size) fingerprints of n-length path lists, -1 for missing files."""
+    fingerprints = np.full((len(files[0]), 2 * len(files)), -1, dtype=np.int64)
+    for j, paths in enumerate(files):
+        for i, p in enumerate(paths):
+            with contextlib.suppress(OSError):
+                st = os.stat(p)
+                fingerprints[i, 2 * j : 2 * j + 2] = st.st_mtime_ns, st.st_size
+    return fingerprints
+
+
 def exif_size(img):
     """Returns corrected PIL image size (width, height) considering EXIF orientation."""
     s = img.size  # (width, height)
@@ -181,7 +197,7 @@ def create_dataloader(
         LOGGER.warning("WARNING ⚠️ --rect is incompatible with DataLoader shuffle, setting shuffle=False")
         shuffle = False
     with torch_distributed_zero_first(rank):  # init dataset *.cache only once if DDP
-        dataset = LoadImagesAndLabels(
+        dataset = (LoadShardedImagesAndLabels if LoadShardedImagesAndLabels.is_shards(path) else LoadImagesAndLabels)(
             path,
             imgsz,
             batch_size,
@@ -200,14 +216,15 @@ def create_dataloader(
     batch_size = min(batch_size, len(dataset))
     nd = torch.cuda.device_count()  # number of CUDA devices
     nw = min([os.cpu_count() // max(nd, 1), batch_size if batch_size > 1 else 0, workers])  # number of workers
-    sampler = None if rank == -1 else SmartDistributedSampler(dataset, shuffle=shuffle)
+    stream = shuffle and not image_weights and isinstance(dataset, LoadShardedImagesAndLabels)  # sequential shard reads
+    sampler = None if rank == -1 or stream else SmartDistributedSampler(dataset, shuffle=shuffle)
     loader = DataLoader if image_weights else InfiniteDataLoader  # only DataLoader allows for attribute updates
     generator = torch.Generator()
     generator.manual_seed(6148914691236517205 + seed + RANK)
     return loader(
-        dataset,
+        ShardStream(dataset, seed=seed) if stream else dataset,
         batch_size=batch_size,
-        shuffle=shuffle and sampler is None,
+        shuffle=shuffle and sampler is None and not stream,
         num_workers=nw,
         sampler=sampler,
         drop_last=quad,
@@ -235,6 +252,8 @@ class InfiniteDataLoader(dataloader.DataLoader):
 
     def __len__(self):
         """Returns the length of the batch sampler's sampler in the InfiniteDataLoader."""
+        if isinstance(self.dataset, IterableDataset):  # endless stream, see ShardStream
+            return math.ceil(len(self.dataset) / self.batch_size)
         return len(self.batch_sampler.sampler)
 
     def __iter__(self):
@@ -320,9 +339,18 @@ class LoadScreenshots:
 
 
 class LoadImages:
-    """YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`."""
+    """
+    YOLOv5 image/video dataloader, i.e. `python detect.py --source image.jpg/vid.mp4`.
 
-    def __init__(self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1):
+    With `workers` > 0 images are decoded and frames letterboxed on a thread pool up to two batches ahead (cv2 releases
+    the GIL) and yielded in file order as (paths, ims, im0s, cap, s) batches of up to `batch_size`. A batch holds images
+    or consecutive frames of one video, never both, so `mode` and `cap` apply to the whole batch and `frame` is the
+    frame number of its last item.
+    """
+
+    def __init__(
+        self, path, img_size=640, stride=32, auto=True, transforms=None, vid_stride=1, batch_size=1, workers=0
+    ):
         """Initializes YOLOv5 loader for images/videos, supporting glob patterns, directories, and lists of paths."""
         if isinstance(path, str) and Path(path).suffix == ".txt":  # *.txt file with img/vid/dir on each line
             path = Path(path).read_text().rsplit()
@@ -348,9 +376,11 @@ class LoadImages:
         self.nf = ni + nv  # number of files
         self.video_flag = [False] * ni + [True] * nv
         self.mode = "image"
-        self.auto = auto
+        self.batch_size = batch_size if workers else 1  # batching needs the worker pool
+        self.auto = auto and self.batch_size == 1  # batched images must share one shape
         self.transforms = transforms  # optional
         self.vid_stride = vid_stride  # video frame-rate stride
+        self.workers = workers
         if any(videos):
             self._new_video(videos[0])  # new video
         else:
@@ -362,10 +392,14 @@ class LoadImages:
     def __iter__(self):
         """Initializes iterator by resetting count and returns the iterator object itself."""
         self.count = 0
+        if self.workers:
+            self.batches = self._prefetch()
         return self
 
     def __next__(self):
         """Advances to the next file in the dataset, raising StopIteration if at the end."""
+        if self.workers:
+            return next(self.batches)
         if self.count == self.nf:
             raise StopIteration
         path = self.files[self.count]
@@ -396,14 +430,83 @@ class LoadImages:
             assert im0 is not None, f"Image Not Found {path}"
             s = f"image {self.count}/{self.nf} {path}: "
 
+        return path, self._transform(im0), im0, self.cap, s
+
+    def _transform(self, im0):
+        """Applies `transforms` or letterboxes a BGR HWC image into a contiguous RGB CHW array."""
         if self.transforms:
-            im = self.transforms(im0)  # transforms
+            return self.transforms(im0)  # transforms
+        im = letterbox(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize
+        im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
+        return np.ascontiguousarray(im)  # contiguous
+
+    def _read_image(self, path):
+        """Reads and transforms one image file on a worker thread."""
+        im0 = cv2.imread(path)  # BGR
+        assert im0 is not None, f"Image Not Found {path}"
+        return self._transform(im0), im0
+
+    def _jobs(self, pool):
+        """Submits all images and video frames in file order, yields (result, path, file index, cap, frame, frames)."""
+        for i, (path, video) in enumerate(zip(self.files, self.video_flag)):
+            if not video:
+                yield pool.apply_async(self._read_image, (path,)), path, i, None, 0, 0
+                continue
+            first_video = i == self.video_flag.index(True)
+            cap = self.cap if first_video else cv2.VideoCapture(path)  # first video is opened in __init__
+            frame, frames = 0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT) / self.vid_stride)
+            while True:  # frames are decoded in order here, letterboxed on the pool
+                if frame == 0 and not first_video:
+                    ret_val, im0 = cap.read()  # like __next__, later videos start without stride
+                else:
+                    for _ in range(self.vid_stride):
+                        cap.grab()
+                    ret_val, im0 = cap.retrieve()
+                if not ret_val:
+                    break
+                frame += 1
+                yield pool.apply_async(lambda x: (self._transform(x), x), (im0,)), path, i, cap, frame, frames
+
+    def _prefetch(self):
+        """Yields batches of items decoded up to two batches ahead, in file order."""
+        with ThreadPool(self.workers) as pool:
+            jobs, pending, batch = self._jobs(pool), deque(), []
+            while True:
+                while len(pending) < 2 * self.batch_size:  # top up prefetch queue
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pending.append(job)
+                if batch and (not pending or pending[0][3] is not batch[0][4] or len(batch) == self.batch_size):
+                    yield self._collate(batch)
+                    batch = []
+                if not pending:
+                    if self.cap is not None:
+                        self.cap.release()
+                    return
+                result, *info = pending.popleft()
+                batch.append((*result.get(), *info))
+
+    def _collate(self, batch):
+        """Returns (path, im, im0, cap, s) for one item or (paths, ims, im0s, cap, s) for a batch, sets mode/frame."""
+        ims, im0s, paths, index, caps, frames, nframes = zip(*batch)
+        n, cap = len(batch), caps[0]
+        self.count = index[-1] + (cap is None)  # like __next__, images count as done once read
+        if cap is not None:
+            if self.cap is not cap:  # new video
+                if self.cap is not None:
+                    self.cap.release()
+                self.cap = cap
+            self.mode, self.frame, self.frames = "video", frames[-1], nframes[-1]
+            f = f"{frames[0]}" if n == 1 else f"{frames[0]}-{frames[-1]}"
+            s = f"video {self.count + 1}/{self.nf} ({f}/{self.frames}) {paths[0]}: "
         else:
-            im = letterbox(im0, self.img_size, stride=self.stride, auto=self.auto)[0]  # padded resize
-            im = im.transpose((2, 0, 1))[::-1]  # HWC to CHW, BGR to RGB
-            im = np.ascontiguousarray(im)  # contiguous
-
-        return path, im, im0, self.cap, s
+            self.mode = "image"
+            f = f"{self.count}" if n == 1 else f"{index[0] + 1}-{self.count}"
+            s = f"image {f}/{self.nf} {paths[0] if n == 1 else Path(paths[0]).parent}: "
+        if n == 1:
+            return paths[0], ims[0], im0s[0], cap, s
+        return list(paths), np.stack(ims, 0), list(im0s), cap, s
 
     def _new_video(self, path):
         """Initializes a new video capture object with path, frame count adjusted by stride, and orientation
@@ -534,10 +637,289 @@ def img2label_paths(img_paths):
     return [sb.join(x.rsplit(sa, 1)).rsplit(".", 1)[0] + ".txt" for x in img_paths]
 
 
+class RaggedArray:
+    """
+    Sequence of variable-length arrays stored as one flat `values` array and per-item [start, end) row offsets.
+
+    Items are views into `values`, so a memory-mapped `values` array is shared by all dataloader workers instead of being
+    copied as millions of small Python-owned arrays. When `values` is itself a RaggedArray, every item is a list of its
+    items, e.g. the polygons of one image.
+    """
+
+    def __init__(self, values, starts, ends):
+        """Initializes from flat `values` and the (n,) `starts` and `ends` offsets of every item."""
+        self.values = values
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+
+    @classmethod
+    def from_offsets(cls, values, offsets):
+        """Creates a RaggedArray from flat `values` and (n+1,) cumulative `offsets`."""
+        return cls(values, offsets[:-1], offsets[1:])
+
+    @classmethod
+    def from_list(cls, arrays, shape=(), dtype=np.float32):
+        """Packs a list of arrays with trailing `shape` into a RaggedArray."""
+        values = np.concatenate(arrays, 0).astype(dtype) if len(arrays) else np.zeros((0, *shape), dtype=dtype)
+        return cls.from_offsets(values, np.cumsum([0] + [len(x) for x in arrays]))
+
+    @classmethod
+    def from_nested(cls, lists, shape=(), dtype=np.float32):
+        """Packs a list of lists of arrays (i.e. per-image polygons) into a nested RaggedArray."""
+        inner = cls.from_list([x for items in lists for x in items], shape, dtype)
+        return cls.from_offsets(inner, np.cumsum([0] + [len(x) for x in lists]))
+
+    @property
+    def offsets(self):
+        """Returns (n+1,) cumulative offsets, valid for a packed RaggedArray that was not reordered."""
+        return np.append(self.starts, self.ends[-1:] if len(self.ends) else 0)
+
+    @property
+    def lengths(self):
+        """Returns the (n,) number of rows of every item."""
+        return self.ends - self.starts
+
+    def copy(self):
+        """Returns a RaggedArray with a writable in-memory copy of `values`, e.g. to edit memory-mapped labels."""
+        values = self.values.copy() if isinstance(self.values, RaggedArray) else np.array(self.values)
+        return RaggedArray(values, self.starts, self.ends)
+
+    def __len__(self):
+        """Returns the number of items."""
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        """Returns item `index`, or a reordered RaggedArray over the same values for a slice or index array."""
+        if isinstance(index, (int, np.integer)):
+            s, e = self.starts[index], self.ends[index]
+            return [self.values[i] for i in range(s, e)] if isinstance(self.values, RaggedArray) else self.values[s:e]
+        return RaggedArray(self.values, self.starts[index], self.ends[index])
+
+    def __iter__(self):
+        """Iterates over all items."""
+        return (self[i] for i in range(len(self)))
+
+
+def save_label_cache(path, cache):
+    """
+    Saves a label cache as a directory of flat .npy columns that load_label_cache() memory-maps.
+
+    Every save writes a new numbered subdirectory of `path` and then switches the `current` pointer file to it, so a
+    cache can be rebuilt while the previous version is still memory-mapped. Older versions are removed afterwards, or by
+    a later save where they are still mapped (Windows can not delete memory-mapped files).
+    """
+    labels, segments = cache["labels"], cache["segments"]
+    if path.exists() and not path.is_dir():
+        path.unlink()  # previous pickled cache
+    path.mkdir(parents=True, exist_ok=True)
+    old = [x for x in path.iterdir() if x.name != "current"]  # previous versions and partial writes
+    version = max((int(x.name) for x in old if x.name.isdigit()), default=-1) + 1
+    d = path / str(version)
+    d.mkdir()
+    columns = {
+        "im_files": np.array(cache["im_files"], dtype=str),
+        "fingerprints": cache["fingerprints"],
+        "counts": cache["counts"],
+        "msgs": np.array(cache["msgs"], dtype=str),
+        "shapes": np.array(cache["shapes"], dtype=np.int64).reshape(-1, 2),
+        "labels": labels.values,
+        "label_offsets": labels.offsets,
+        "segments": segments.values.values,
+        "segment_offsets": segments.values.offsets,
+        "segment_index": segments.offsets,
+    }
+    if "records" in cache:  # pack_shards() index
+        columns["records"] = cache["records"]
+    for k, v in columns.items():
+        np.save(d / f"{k}.npy", v)
+    (d / "meta.json").write_text(json.dumps({"version": cache["version"]}))
+    (path / "current.tmp").write_text(d.name)
+    os.replace(path / "current.tmp", path / "current")  # atomic switch to the new version
+    for x in old:  # mapped files stay until a later save
+        if x.is_dir():
+            shutil.rmtree(x, ignore_errors=True)
+        else:
+            with contextlib.suppress(OSError):
+                x.unlink()
+
+
+def load_label_cache(path):
+    """Loads the current version of a label cache saved by save_label_cache() with memory-mapped label columns."""
+    path = path / (path / "current").read_text().strip()
+    meta = json.loads((path / "meta.json").read_text())
+    c = {k: np.load(path / f"{k}.npy", mmap_mode="r") for k in ("labels", "label_offsets", "segments", "shapes")}
+    polygons = RaggedArray.from_offsets(c["segments"], np.load(path / "segment_offsets.npy"))
+    return {
+        **meta,
+        "im_files": np.load(path / "im_files.npy").tolist(),
+        "fingerprints": np.load(path / "fingerprints.npy"),
+        "counts": np.load(path / "counts.npy"),
+        "msgs": np.load(path / "msgs.npy").tolist(),
+        "labels": RaggedArray.from_offsets(c["labels"], c["label_offsets"]),
+        "shapes": c["shapes"],
+        "segments": RaggedArray.from_offsets(polygons, np.load(path / "segment_index.npy")),
+        **({"records": np.load(path / "records.npy")} if (path / "records.npy").exists() else {}),
+    }
+
+
+class SharedImageCache:
+    """
+    Resized images in one shared-memory arena, filled once and attached by every DataLoader worker and local DDP rank.
+
+    Every process derives the same slot layout from the dataset shapes, so attaching only needs the arena name. A flag
+    per image marks filled slots, images that are not filled or do not match their slot are read from disk instead.
+    """
+
+    backend = "shm"
+
+    def __init__(self, name, shapes, img_size, header=0):
+        """Lays out arena `name` for (n,2) image `shapes` (wh) resized to long side `img_size` like load_image()."""
+        self.name = name
+        self.hw0 = np.stack((shapes[:, 1], shapes[:, 0]), 1).astype(np.int64)  # original hw
+        r = img_size / self.hw0.max(1, keepdims=True)  # ratio
+        self.hw = np.where(r != 1, np.ceil(self.hw0 * r), self.hw0).astype(np.int64)  # resized hw
+        nbytes = self.hw.prod(1) * 3  # BGR uint8
+        self.header = header  # bytes before the per-image flags
+        self.offsets = header + len(self.hw) + np.cumsum(nbytes) - nbytes  # image slots follow the flags
+        self.size = int(header + len(self.hw) + nbytes.sum())
+        self.created = False
+        self.shm = self.buf = self.flags = None
+
+    def check_memory(self, safety_margin=0.1, prefix=""):
+        """Checks that the arena fits in available RAM and, where mounted, in /dev/shm."""
+        gb = 1 << 30  # bytes per gigabyte
+        available = psutil.virtual_memory().available
+        if os.path.isdir("/dev/shm"):
+            available = min(available, shutil.disk_usage("/dev/shm").free)
+        fits = self.size * (1 + safety_margin) < available
+        if not fits:
+            LOGGER.info(
+                f"{prefix}{self.size / gb:.1f}GB shared memory required, {available / gb:.1f}GB available, "
+                f"not caching images ⚠️"
+            )
+        return fits
+
+    def open(self, prefix="", create=True):
+        """Attaches the arena, or creates it if it does not exist yet and fits in memory, returns True on success."""
+        try:
+            self.shm = self.attach(self.name)
+        except FileNotFoundError:
+            if not create or not self.check_memory(prefix=prefix):
+                return False
+            self.shm = shared_memory.SharedMemory(self.name, create=True, size=self.size)
+            self.created = True
+            atexit.register(self.shm.unlink)  # forked DataLoader workers leave with os._exit() and skip this
+        self.buf = np.ndarray((self.size,), np.uint8, self.shm.buf)
+        self.flags = self.buf[self.header : self.header + len(self.hw)]
+        return True
+
+    @staticmethod
+    def attach(name):
+        """Attaches shared memory `name` without tracking it, so that only the creating process unlinks it at exit."""
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(name, track=False)
+        register, resource_tracker.register = resource_tracker.register, lambda *args: None  # Python<3.13 always tracks
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+    def slot(self, i):
+        """Returns the (h,w,3) uint8 view of image slot `i`."""
+        return self.buf[self.offsets[i] : self.offsets[i] + self.hw[i].prod() * 3].reshape(*self.hw[i], 3)
+
+    def fill(self, load, prefix=""):
+        """Copies `load(i)[0]` of every unfilled image into its slot on a thread pool, see LoadImagesAndLabels."""
+        b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
+        todo = (self.flags == 0).nonzero()[0]
+        results = ThreadPool(NUM_THREADS).imap(lambda i: (i, load(i)[0]), todo)
+        pbar = tqdm(results, total=len(todo), bar_format=TQDM_BAR_FORMAT, disable=LOCAL_RANK > 0)
+        for i, im in pbar:
+            if im.shape == (*self.hw[i], 3) and im.dtype == np.uint8:  # other images stay on disk
+                self.slot(i)[:] = im
+                self.flags[i] = 1
+                b += im.nbytes
+            pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB {self.backend})"
+        pbar.close()
+
+    def __len__(self):
+        """Returns the number of image slots."""
+        return len(self.hw)
+
+    def __getitem__(self, i):
+        """Returns a read-only view of cached image `i`, or None if it was not cached."""
+        if not self.flags[i]:
+            return None
+        im = self.slot(i)
+        im.flags.writeable = False
+        return im
+
+    def __getstate__(self):
+        """Pickles the layout only, e.g. for spawned DataLoader workers, which attach to the arena by name."""
+        return {**self.__dict__, "shm": None, "buf": None, "flags": None, "created": False}
+
+    def __setstate__(self, state):
+        """Restores the layout and attaches to the arena."""
+        self.__dict__.update(state)
+        self.open(create=False)
+
+
+class DiskImageCache(SharedImageCache):
+    """
+    Resized images packed into one memory-mapped file, the `--cache disk` backend.
+
+    The file starts with a `key` of the dataset and resize settings followed by the per-image flags, so it is reused
+    across runs, completed after an interrupted fill and rebuilt when the dataset changes. Samples are read straight
+    from the page cache without decoding, and random access costs one slice of the mapping.
+    """
+
+    backend = "disk"
+
+    def __init__(self, path, key, shapes, img_size):
+        """Lays out cache file `path` identified by `key` bytes for (n,2) image `shapes` (wh) and `img_size`."""
+        super().__init__(path.name, shapes, img_size, header=len(key))
+        self.path = Path(path)
+        self.key = key
+
+    def check_space(self, prefix=""):
+        """Checks that the cache file fits on the disk of its directory."""
+        gb = 1 << 30  # bytes per gigabyte
+        free = shutil.disk_usage(self.path.parent).free
+        if self.size >= free:
+            LOGGER.info(f"{prefix}{self.size / gb:.1f}GB disk required, {free / gb:.1f}GB free, not caching images")
+        return self.size < free
+
+    def open(self, prefix="", create=True):
+        """Memory-maps the cache file, creating it if `create` and it is missing or stale, returns True on success."""
+        valid = False
+        with contextlib.suppress(OSError):
+            with open(self.path, "rb") as f:
+                valid = f.read(len(self.key)) == self.key and self.path.stat().st_size == self.size
+        if not valid:
+            if not create or not self.check_space(prefix):
+                return False
+            try:
+                with open(self.path, "wb") as f:
+                    f.write(self.key)
+                    f.truncate(self.size)  # sparse, all flags unset
+            except OSError as e:
+                LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {self.path.parent} is not writeable: {e}")
+                return False
+        self.buf = np.memmap(self.path, np.uint8, "r+" if create else "r", shape=(self.size,))
+        self.flags = self.buf[self.header : self.header + len(self.hw)]
+        self.created = create and not self.flags.all()  # needs filling
+        return True
+
+    def fill(self, load, prefix=""):
+        """Copies every unfilled image into the cache file and flushes it to disk."""
+        super().fill(load, prefix)
+        self.buf.flush()
+
+
 class LoadImagesAndLabels(Dataset):
     """Loads images and their corresponding labels for training and validation in YOLOv5."""
 
-    cache_version = 0.6  # dataset labels *.cache version
+    cache_version = 0.8  # dataset labels *.cache version
     rand_interp_methods = [cv2.INTER_NEAREST, cv2.INTER_LINEAR, cv2.INTER_CUBIC, cv2.INTER_AREA, cv2.INTER_LANCZOS4]
 
     def __init__(
@@ -570,64 +952,20 @@ class LoadImagesAndLabels(Dataset):
         self.path = path
         self.albumentations = Albumentations(size=img_size) if augment else None
 
-        try:
-            f = []  # image files
-            for p in path if isinstance(path, list) else [path]:
-                p = Path(p)  # os-agnostic
-                if p.is_dir():  # dir
-                    f += glob.glob(str(p / "**" / "*.*"), recursive=True)
-                    # f = list(p.rglob('*.*'))  # pathlib
-                elif p.is_file():  # file
-                    with open(p) as t:
-                        t = t.read().strip().splitlines()
-                        parent = str(p.parent) + os.sep
-                        f += [x.replace("./", parent, 1) if x.startswith("./") else x for x in t]  # to global path
-                        # f += [p.parent / x.lstrip(os.sep) for x in t]  # to global path (pathlib)
-                else:
-                    raise FileNotFoundError(f"{prefix}{p} does not exist")
-            self.im_files = sorted(x.replace("/", os.sep) for x in f if x.split(".")[-1].lower() in IMG_FORMATS)
-            # self.img_files = sorted([x for x in f if x.suffix[1:].lower() in IMG_FORMATS])  # pathlib
-            assert self.im_files, f"{prefix}No images found"
-        except Exception as e:
-            raise Exception(f"{prefix}Error loading data from {path}: {e}\n{HELP_URL}") from e
-
-        # Check cache
-        self.label_files = img2label_paths(self.im_files)  # labels
-        cache_path = (p if p.is_file() else Path(self.label_files[0]).parent).with_suffix(".cache")
-        try:
-            cache, exists = np.load(cache_path, allow_pickle=True).item(), True  # load dict
-            assert cache["version"] == self.cache_version  # matches current version
-            assert cache["hash"] == get_hash(self.label_files + self.im_files)  # identical hash
-        except Exception:
-            cache, exists = self.cache_labels(cache_path, prefix), False  # run cache ops
-
-        # Display cache
-        nf, nm, ne, nc, n = cache.pop("results")  # found, missing, empty, corrupt, total
-        if exists and LOCAL_RANK in {-1, 0}:
-            d = f"Scanning {cache_path}... {nf} images, {nm + ne} backgrounds, {nc} corrupt"
-            tqdm(None, desc=prefix + d, total=n, initial=n, bar_format=TQDM_BAR_FORMAT)  # display cache results
-            if cache["msgs"]:
-                LOGGER.info("\n".join(cache["msgs"]))  # display warnings
-        assert nf > 0 or not augment, f"{prefix}No labels found in {cache_path}, can not start training. {HELP_URL}"
-
-        # Read cache
-        [cache.pop(k) for k in ("hash", "version", "msgs")]  # remove items
-        labels, shapes, self.segments = zip(*cache.values())
-        nl = len(np.concatenate(labels, 0))  # number of labels
+        # Load labels
+        cache_path = self.load_labels(path, augment, prefix)
+        nl = self.labels.lengths.sum()  # number of labels
         assert nl > 0 or not augment, f"{prefix}All labels empty in {cache_path}, can not start training. {HELP_URL}"
-        self.labels = list(labels)
-        self.shapes = np.array(shapes)
-        self.im_files = list(cache.keys())  # update
-        self.label_files = img2label_paths(cache.keys())  # update
+        n = len(self.im_files)
 
         # Filter images
         if min_items:
-            include = np.array([len(x) >= min_items for x in self.labels]).nonzero()[0].astype(int)
+            include = (self.labels.lengths >= min_items).nonzero()[0].astype(int)
             LOGGER.info(f"{prefix}{n - len(include)}/{n} images filtered from dataset")
             self.im_files = [self.im_files[i] for i in include]
             self.label_files = [self.label_files[i] for i in include]
-            self.labels = [self.labels[i] for i in include]
-            self.segments = [self.segments[i] for i in include]
+            self.labels = self.labels[include]
+            self.segments = self.segments[include]
             self.shapes = self.shapes[include]  # wh
 
         # Create indices
@@ -643,16 +981,18 @@ class LoadImagesAndLabels(Dataset):
 
         # Update labels
         include_class = []  # filter labels to include only these classes (optional)
-        self.segments = list(self.segments)
         include_class_array = np.array(include_class).reshape(1, -1)
-        for i, (label, segment) in enumerate(zip(self.labels, self.segments)):
-            if include_class:
+        if include_class:
+            labels, segments = [], []
+            for label, segment in zip(self.labels, self.segments):
                 j = (label[:, 0:1] == include_class_array).any(1)
-                self.labels[i] = label[j]
-                if segment:
-                    self.segments[i] = [segment[idx] for idx, elem in enumerate(j) if elem]
-            if single_cls:  # single-class training, merge all classes into 0
-                self.labels[i][:, 0] = 0
+                labels.append(label[j])
+                segments.append([segment[idx] for idx, elem in enumerate(j) if elem] if segment else segment)
+            self.labels = RaggedArray.from_list(labels, shape=(5,))
+            self.segments = RaggedArray.from_nested(segments, shape=(2,))
+        if single_cls:  # single-class training, merge all classes into 0
+            self.labels = self.labels.copy()  # writable copy of the memory-mapped labels
+            self.labels.values[:, 0] = 0
 
         # Rectangular Training
         if self.rect:
@@ -662,8 +1002,8 @@ class LoadImagesAndLabels(Dataset):
             irect = ar.argsort()
             self.im_files = [self.im_files[i] for i in irect]
             self.label_files = [self.label_files[i] for i in irect]
-            self.labels = [self.labels[i] for i in irect]
-            self.segments = [self.segments[i] for i in irect]
+            self.labels = self.labels[irect]
+            self.segments = self.segments[irect]
             self.shapes = s[irect]  # wh
             ar = ar[irect]
 
@@ -680,31 +1020,87 @@ class LoadImagesAndLabels(Dataset):
             self.batch_shapes = np.ceil(np.array(shapes) * img_size / stride + pad).astype(int) * stride
 
         # Cache images into RAM/disk for faster training
-        if cache_images == "ram" and not self.check_cache_ram(prefix=prefix):
-            cache_images = False
         self.ims = [None] * n
         self.npy_files = [Path(f).with_suffix(".npy") for f in self.im_files]
-        if cache_images:
+        if cache_images == "ram" and not self.check_cache_ram(prefix=prefix):
+            cache_images = False
+        if cache_images in {"shm", "disk"}:
+            self.cache_images_to_arena(cache_images, cache_path, prefix)
+        elif cache_images:
             b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
             self.im_hw0, self.im_hw = [None] * n, [None] * n
-            fcn = self.cache_images_to_disk if cache_images == "disk" else self.load_image
-            results = ThreadPool(NUM_THREADS).imap(lambda i: (i, fcn(i)), self.indices)
+            results = ThreadPool(NUM_THREADS).imap(lambda i: (i, self.load_image(i)), self.indices)
             pbar = tqdm(results, total=len(self.indices), bar_format=TQDM_BAR_FORMAT, disable=LOCAL_RANK > 0)
             for i, x in pbar:
-                if cache_images == "disk":
-                    b += self.npy_files[i].stat().st_size
-                else:  # 'ram'
-                    self.ims[i], self.im_hw0[i], self.im_hw[i] = x  # im, hw_orig, hw_resized = load_image(self, i)
-                    b += self.ims[i].nbytes * WORLD_SIZE
+                self.ims[i], self.im_hw0[i], self.im_hw[i] = x  # im, hw_orig, hw_resized = load_image(self, i)
+                b += self.ims[i].nbytes * WORLD_SIZE
                 pbar.desc = f"{prefix}Caching images ({b / gb:.1f}GB {cache_images})"
             pbar.close()
 
+    def load_labels(self, path, augment=False, prefix=""):
+        """Finds images under `path`, loads or updates their label cache and returns the cache path."""
+        try:
+            f = []  # image files
+            for p in path if isinstance(path, list) else [path]:
+                p = Path(p)  # os-agnostic
+                if p.is_dir():  # dir
+                    f += glob.glob(str(p / "**" / "*.*"), recursive=True)
+                    # f = list(p.rglob('*.*'))  # pathlib
+                elif p.is_file():  # file
+                    with open(p) as t:
+                        t = t.read().strip().splitlines()
+                        parent = str(p.parent) + os.sep
+                        f += [x.replace("./", parent, 1) if x.startswith("./") else x for x in t]  # to global path
+                        # f += [p.parent / x.lstrip(os.sep) for x in t]  # to global path (pathlib)
+                else:
+                    raise FileNotFoundError(f"{prefix}{p} does not exist")
+            self.im_files = sorted(x.replace("/", os.sep) for x in f if x.split(".")[-1].lower() in IMG_FORMATS)
+            # self.img_files = sorted([x for x in f if x.suffix[1:].lower() in IMG_FORMATS])  # pathlib
+            assert self.im_files, f"{prefix}No images found"
+        except Exception as e:
+            raise Exception(f"{prefix}Error loading data from {path}: {e}\n{HELP_URL}") from e
+
+        # Check cache
+        self.label_files = img2label_paths(self.im_files)  # labels
+        cache_path = (p if p.is_file() else Path(self.label_files[0]).parent).with_suffix(".cache")
+        try:
+            cache = load_label_cache(cache_path)  # memory-mapped columns
+            assert cache["version"] == self.cache_version  # matches current version
+        except Exception:
+            cache = None  # missing, outdated or unreadable cache, verify every file
+        fingerprints = get_fingerprints(self.im_files, self.label_files)  # (mtime, size) of every image and label
+        exists = (
+            cache is not None
+            and cache["im_files"] == self.im_files
+            and np.array_equal(cache["fingerprints"], fingerprints)
+        )  # no files added, removed or changed
+        if not exists:
+            cache = self.cache_labels(cache_path, prefix, cache, fingerprints)  # verify added and changed files only
+
+        # Display cache
+        nm, nf, ne, nc = cache["counts"].sum(0)  # missing, found, empty, corrupt
+        n = len(cache["im_files"])  # total
+        if exists and LOCAL_RANK in {-1, 0}:
+            d = f"Scanning {cache_path}... {nf} images, {nm + ne} backgrounds, {nc} corrupt"
+            tqdm(None, desc=prefix + d, total=n, initial=n, bar_format=TQDM_BAR_FORMAT)  # display cache results
+            if msgs := [x for x in cache["msgs"] if x]:
+                LOGGER.info("\n".join(msgs))  # display warnings
+        assert nf > 0 or not augment, f"{prefix}No labels found in {cache_path}, can not start training. {HELP_URL}"
+
+        # Read cache
+        valid = cache["counts"][:, 3] == 0  # corrupt images are cached only to skip them on the next scan
+        self.labels, self.segments = cache["labels"][valid], cache["segments"][valid]  # views of the cache columns
+        self.shapes = np.array(cache["shapes"])[valid]
+        self.im_files = [f for f, v in zip(cache["im_files"], valid) if v]  # update
+        self.label_files = img2label_paths(self.im_files)  # update
+        return cache_path
+
     def check_cache_ram(self, safety_margin=0.1, prefix=""):
         """Checks if available RAM is sufficient for caching images, adjusting for a safety margin."""
         b, gb = 0, 1 << 30  # bytes of cached images, bytes per gigabytes
         n = min(self.n, 30)  # extrapolate from 30 random images
         for _ in range(n):
-            im = cv2.imread(random.choice(self.im_files))  # sample image
+            im = self.imread(random.randrange(self.n))  # sample image
             ratio = self.img_size / max(im.shape[0], im.shape[1])  # max(h, w)  # ratio
             b += im.nbytes * ratio**2
         mem_required = b * self.n / n  # GB required to cache dataset into RAM
@@ -718,42 +1114,73 @@ class LoadImagesAndLabels(Dataset):
             )
         return cache
 
-    def cache_labels(self, path=Path("./labels.cache"), prefix=""):
-        """Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity."""
-        x = {}  # dict
-        nm, nf, ne, nc, msgs = 0, 0, 0, 0, []  # number missing, found, empty, corrupt, messages
+    def cache_labels(self, path=Path("./labels.cache"), prefix="", cache=None, fingerprints=None):
+        """
+        Caches dataset labels, verifies images, reads shapes, and tracks dataset integrity.
+
+        Entries of a previous `cache` whose image and label fingerprints are unchanged are reused, so only added or
+        modified files are verified again.
+        """
+        n = len(self.im_files)
+        if fingerprints is None:
+            fingerprints = get_fingerprints(self.im_files, self.label_files)
+        reuse = np.full(n, -1, dtype=np.int64)  # cache row of every unchanged image
+        if cache is not None:
+            rows = {f: i for i, f in enumerate(cache["im_files"])}
+            reuse = np.array([rows.get(f, -1) for f in self.im_files], dtype=np.int64)
+            found = reuse >= 0
+            found[found] = (cache["fingerprints"][reuse[found]] == fingerprints[found]).all(1)
+            reuse[~found] = -1
+
+        labels, shapes, segments, msgs = [None] * n, np.zeros((n, 2), dtype=np.int64), [[]] * n, [""] * n
+        counts = np.zeros((n, 4), dtype=np.int64)  # number missing, found, empty, corrupt per image
+        for i in (reuse >= 0).nonzero()[0]:
+            j = reuse[i]
+            labels[i], shapes[i], segments[i] = cache["labels"][j], cache["shapes"][j], cache["segments"][j]
+            counts[i], msgs[i] = cache["counts"][j], cache["msgs"][j]
+
+        todo = (reuse < 0).nonzero()[0]
+        nm, nf, ne, nc = counts.sum(0)
         desc = f"{prefix}Scanning {path.parent / path.stem}..."
         with Pool(NUM_THREADS) as pool:
             pbar = tqdm(
-                pool.imap(verify_image_label, zip(self.im_files, self.label_files, repeat(prefix))),
+                pool.imap(verify_image_label, ((self.im_files[i], self.label_files[i], prefix) for i in todo)),
                 desc=desc,
-                total=len(self.im_files),
+                total=n,
+                initial=n - len(todo),
                 bar_format=TQDM_BAR_FORMAT,
             )
-            for im_file, lb, shape, segments, nm_f, nf_f, ne_f, nc_f, msg in pbar:
+            for i, (im_file, lb, shape, segments_f, nm_f, nf_f, ne_f, nc_f, msg) in zip(todo, pbar):
                 nm += nm_f
                 nf += nf_f
                 ne += ne_f
                 nc += nc_f
                 if im_file:
-                    x[im_file] = [lb, shape, segments]
-                if msg:
-                    msgs.append(msg)
+                    labels[i], shapes[i], segments[i] = lb, shape, segments_f
+                else:  # corrupt
+                    labels[i] = np.zeros((0, 5), dtype=np.float32)
+                counts[i], msgs[i] = (nm_f, nf_f, ne_f, nc_f), msg
                 pbar.desc = f"{desc} {nf} images, {nm + ne} backgrounds, {nc} corrupt"
 
         pbar.close()
-        if msgs:
-            LOGGER.info("\n".join(msgs))
+        fingerprints[todo] = get_fingerprints([self.im_files[i] for i in todo], [self.label_files[i] for i in todo])
+        if any(msgs):
+            LOGGER.info("\n".join(x for x in msgs if x))
         if nf == 0:
             LOGGER.warning(f"{prefix}WARNING ⚠️ No labels found in {path}. {HELP_URL}")
-        x["hash"] = get_hash(self.label_files + self.im_files)
-        x["results"] = nf, nm, ne, nc, len(self.im_files)
-        x["msgs"] = msgs  # warnings
-        x["version"] = self.cache_version  # cache version
+        x = {
+            "im_files": self.im_files,
+            "fingerprints": fingerprints,  # re-read after verify_image_label() may have restored corrupt JPEGs
+            "counts": counts,
+            "msgs": msgs,  # warnings
+            "labels": RaggedArray.from_list(labels, shape=(5,)),
+            "shapes": shapes,
+            "segments": RaggedArray.from_nested(segments, shape=(2,)),
+            "version": self.cache_version,  # cache version
+        }
         try:
-            np.save(path, x)  # save cache for next time
-            path.with_suffix(".cache.npy").rename(path)  # remove .npy suffix
-            LOGGER.info(f"{prefix}New cache created: {path}")
+            save_label_cache(path, x)  # save cache for next time
+            LOGGER.info(f"{prefix}{'New cache created' if cache is None else 'Cache updated'}: {path}")
         except Exception as e:
             LOGGER.warning(f"{prefix}WARNING ⚠️ Cache directory {path.parent} is not writeable: {e}")  # not writeable
         return x
@@ -850,17 +1277,9 @@ class LoadImagesAndLabels(Dataset):
 
         Returns (im, original hw, resized hw)
         """
-        im, f, fn = (
-            self.ims[i],
-            self.im_files[i],
-            self.npy_files[i],
-        )
+        im = self.ims[i]
         if im is None:  # not cached in RAM
-            if fn.exists():  # load npy
-                im = np.load(fn)
-            else:  # read image
-                im = cv2.imread(f)  # BGR
-                assert im is not None, f"Image Not Found {f}"
+            im = self.imread(i)
             h0, w0 = im.shape[:2]  # orig hw
             r = self.img_size / max(h0, w0)  # ratio
             if r != 1:  # if sizes are not equal
@@ -869,11 +1288,31 @@ class LoadImagesAndLabels(Dataset):
             return im, (h0, w0), im.shape[:2]  # im, hw_original, hw_resized
         return self.ims[i], self.im_hw0[i], self.im_hw[i]  # im, hw_original, hw_resized
 
-    def cache_images_to_disk(self, i):
-        """Saves an image to disk as an *.npy file for quicker loading, identified by index `i`."""
-        f = self.npy_files[i]
-        if not f.exists():
-            np.save(f.as_posix(), cv2.imread(self.im_files[i]))
+    def imread(self, i):
+        """Reads image `i` as BGR from its *.npy file if present, else from the image file."""
+        f, fn = self.im_files[i], self.npy_files[i]
+        if fn.exists():  # load npy
+            return np.load(fn)
+        im = cv2.imread(f)  # BGR
+        assert im is not None, f"Image Not Found {f}"
+        return im
+
+    def cache_images_to_arena(self, backend, cache_path, prefix=""):
+        """Caches resized images in shared memory ('shm') or in a memory-mapped file beside `cache_path` ('disk')."""
+        key = f"{self.img_size}{self.augment}{self.im_files}{self.shapes.tolist()}"
+        if backend == "shm":
+            owner = os.getppid() if LOCAL_RANK != -1 else os.getpid()  # local DDP ranks are children of one launcher
+            name = f"yolov5_{hashlib.sha256(f'{owner}{key}'.encode()).hexdigest()[:16]}"
+            ims = SharedImageCache(name, self.shapes, self.img_size)
+        else:
+            key += str(get_fingerprints(self.im_files).tolist())  # rebuild when images change
+            f = cache_path.with_name(f"{cache_path.stem}_{self.img_size}_{'linear' if self.augment else 'area'}.images")
+            ims = DiskImageCache(f, hashlib.sha256(key.encode()).digest(), self.shapes, self.img_size)
+        if not ims.open(prefix, create=LOCAL_RANK in {-1, 0}):
+            return
+        if ims.created:  # attached ranks reuse the images filled by the first one
+            ims.fill(self.load_image, prefix)
+        self.ims, self.im_hw0, self.im_hw = ims, list(map(tuple, ims.hw0.tolist())), list(map(tuple, ims.hw.tolist()))
 
     def load_mosaic(self, index):
         """Loads a 4-image mosaic for YOLOv5, combining 1 selected and 3 random images, with labels and segments."""
@@ -1053,6 +1492,124 @@ class LoadImagesAndLabels(Dataset):
         return torch.stack(im4, 0), torch.cat(label4, 0), path4, shapes4
 
 
+class LoadShardedImagesAndLabels(LoadImagesAndLabels):
+    """
+    Loads a dataset packed by pack_shards() from a directory of shard-*.bin files and an index.
+
+    Labels, shapes and segments come from the index and images are decoded from memory-mapped shards, so no image or
+    label file is opened per sample. Wrap it in a ShardStream for sequential, shuffle-buffered reads during training.
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        """Initializes from shard directory `path`, other arguments as for LoadImagesAndLabels."""
+        self.maps, self.buffer = {}, {}  # memory-mapped shards, records read ahead by ShardStream
+        super().__init__(path, *args, **kwargs)
+
+    @staticmethod
+    def is_shards(path):
+        """Returns True if `path` is a directory written by pack_shards()."""
+        return isinstance(path, (str, Path)) and (Path(path) / "index" / "current").is_file()
+
+    def load_labels(self, path, augment=False, prefix=""):
+        """Loads labels, shapes and shard records from the index of shard directory `path`, returns the index path."""
+        index = Path(path) / "index"
+        try:
+            cache = load_label_cache(index)
+            assert cache["version"] == self.cache_version, f"index version {cache['version']}, re-run pack_shards()"
+        except Exception as e:
+            raise Exception(f"{prefix}Error loading shards from {path}: {e}\n{HELP_URL}") from e
+        self.labels, self.segments = cache["labels"], cache["segments"]
+        self.shapes = np.array(cache["shapes"])
+        self.im_files = cache["im_files"]  # source paths, used for names only
+        self.label_files = img2label_paths(self.im_files)
+        self.records = cache["records"]  # (shard, offset, length)
+        self.rows = {f: i for i, f in enumerate(self.im_files)}  # records row of every image, survives reordering
+        if LOCAL_RANK in {-1, 0}:
+            ns = self.records[:, 0].max() + 1  # number of shards
+            LOGGER.info(f"{prefix}Loaded {len(self.im_files)} images from {ns} shards in {path}")
+        return index
+
+    def read_record(self, i):
+        """Returns the encoded bytes of image `i` as a view into its memory-mapped shard."""
+        shard, offset, length = self.records[self.rows[self.im_files[i]]]
+        if shard not in self.maps:
+            self.maps[shard] = np.memmap(Path(self.path) / f"shard-{shard:05d}.bin", np.uint8, "r")
+        return self.maps[shard][offset : offset + length]
+
+    def imread(self, i):
+        """Decodes image `i` as BGR from the read-ahead buffer or from its shard."""
+        data = self.buffer.get(i)
+        im = cv2.imdecode(self.read_record(i) if data is None else data, cv2.IMREAD_COLOR)
+        assert im is not None, f"Image Not Decoded {self.im_files[i]}"
+        return im
+
+    def __getstate__(self):
+        """Drops shard mappings and read-ahead records when pickled, e.g. for spawned DataLoader workers."""
+        return {**self.__dict__, "maps": {}, "buffer": {}}
+
+
+class ShardStream(IterableDataset):
+    """
+    Streams a LoadShardedImagesAndLabels dataset through a shuffle buffer while reading shards sequentially.
+
+    Shards are split into chunks of consecutive records, and every pass deals the shuffled chunks out to all DDP ranks
+    and DataLoader workers, so each worker reads its own chunks front to back. Samples are drawn at random from the last
+    `buffer_size` records read, which also supply the mosaic partners. The stream is endless, InfiniteDataLoader cuts it
+    into epochs of len(self) samples per rank.
+    """
+
+    def __init__(self, dataset, buffer_size=1000, chunk_size=1000, seed=0):
+        """Initializes a stream over `dataset` with a `buffer_size` shuffle buffer and `chunk_size` record chunks."""
+        self.dataset = dataset
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+    def __len__(self):
+        """Returns the number of samples per rank and epoch."""
+        return math.ceil(len(self.dataset) / WORLD_SIZE)
+
+    def chunks(self, slots):
+        """Splits dataset indices in shard order into runs of consecutive records, at least one per slot."""
+        d = self.dataset
+        records = d.records[[d.rows[f] for f in d.im_files]]  # (shard, offset, length) of every dataset index
+        order = np.lexsort((records[:, 1], records[:, 0]))  # dataset indices in shard order
+        size = max(1, min(self.chunk_size, len(order) // slots))
+        ends = np.flatnonzero(np.diff(records[order, 0])) + 1  # shard boundaries
+        return [
+            order[i : min(i + size, b)] for a, b in zip([0, *ends], [*ends, len(order)]) for i in range(a, b, size)
+        ]
+
+    def __iter__(self):
+        """Yields samples of this rank and worker forever."""
+        info = torch.utils.data.get_worker_info()
+        worker, workers = (info.id, info.num_workers) if info else (0, 1)
+        slot, slots = max(RANK, 0) * workers + worker, WORLD_SIZE * workers
+        dataset = copy.copy(self.dataset)  # own read-ahead buffer and indices
+        dataset.buffer, keys = {}, []
+        dataset.indices = keys  # dataset[j] returns image keys[j], mosaic partners are drawn from keys as well
+        chunks = self.chunks(slots)
+        buffer_size = min(self.buffer_size, max(1, len(self.dataset) // slots))
+        for epoch in count():
+            perm = np.random.RandomState(self.seed + epoch).permutation(len(chunks))
+            for c in perm[slot::slots] if len(chunks) >= slots else perm[slot % len(chunks) :][:1]:
+                for i in chunks[c]:
+                    dataset.buffer[i] = np.array(dataset.read_record(i))  # sequential read
+                    keys.append(i)
+                    if len(keys) >= buffer_size:
+                        yield self.pop(dataset, keys)
+
+    @staticmethod
+    def pop(dataset, keys):
+        """Returns a random buffered sample and drops it from the buffer."""
+        j = random.randrange(len(keys))
+        i, sample = keys[j], dataset[j]
+        keys[j] = keys[-1]
+        keys.pop()
+        dataset.buffer.pop(i, None)  # may be buffered twice across passes of small datasets
+        return sample
+
+
 # Ancillary functions --------------------------------------------------------------------------------------------------
 def flatten_recursive(path=DATASETS_DIR / "coco128"):
     """Flattens a directory by copying all files from subdirectories to a new top-level directory, preserving
@@ -1132,6 +1689,49 @@ def autosplit(path=DATASETS_DIR / "coco128/images", weights=(0.9, 0.1, 0.0), ann
                 f.write(f"./{img.relative_to(path.parent).as_posix()}" + "\n")  # add image to txt file
 
 
+def pack_shards(path=DATASETS_DIR / "coco128/images/train2017", out=None, shard_size=1 << 30):
+    """Pack a dataset into large shard files and an index for LoadShardedImagesAndLabels
+    Usage: from utils.dataloaders import *; pack_shards().
+
+    Arguments:
+        path:        Images directory or *.txt image list, with labels found like for LoadImagesAndLabels
+        out:         Output directory, default path + '_shards', usable as train/val path in a dataset *.yaml
+        shard_size:  Maximum bytes per shard, unless a single image is larger
+    """
+    dataset = LoadImagesAndLabels(path)  # verify images and labels
+    out = Path(out or f"{Path(path).with_suffix('')}_shards")
+    out.mkdir(parents=True, exist_ok=True)
+    n = len(dataset.im_files)
+    records = np.zeros((n, 3), dtype=np.int64)  # (shard, offset, length)
+    shard, f = -1, None
+    for i, im_file in enumerate(tqdm(dataset.im_files, desc=f"Packing {path} into {out}", bar_format=TQDM_BAR_FORMAT)):
+        data = Path(im_file).read_bytes()  # encoded image, decoded by cv2.imdecode() on read
+        if f is None or (f.tell() and f.tell() + len(data) > shard_size):
+            if f:
+                f.close()
+            shard += 1
+            f = open(out / f"shard-{shard:05d}.bin", "wb")
+        records[i] = shard, f.tell(), len(data)
+        f.write(data)
+    f.close()
+    nl = dataset.labels.lengths > 0
+    save_label_cache(
+        out / "index",
+        {
+            "im_files": dataset.im_files,
+            "fingerprints": np.zeros((n, 4), dtype=np.int64),
+            "counts": np.stack((np.zeros(n), nl, ~nl, np.zeros(n)), 1).astype(np.int64),  # found or empty
+            "msgs": [""] * n,
+            "labels": RaggedArray.from_list(list(dataset.labels), shape=(5,)),
+            "shapes": dataset.shapes,
+            "segments": RaggedArray.from_nested(list(dataset.segments), shape=(2,)),
+            "records": records,
+            "version": LoadImagesAndLabels.cache_version,
+        },
+    )
+    print(f"Packed {n} images into {shard + 1} shards in {out}")
+
+
 def verify_image_label(args):
     """Verifies a single image-label pair, ensuring image format, size, and legal label values."""
     im_file, lb_file, prefix = args
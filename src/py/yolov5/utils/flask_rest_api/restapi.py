@@ -1,49 +1,187 @@
 # Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
-"""Run a Flask REST API exposing one or more YOLOv5s models."""
+"""
+Run an asyncio REST API exposing one or more YOLOv5 models.
+
+Uploads are decoded on a thread pool and concurrent requests to the same model are gathered into micro-batches that
+run as one forward pass, a batch is dispatched once `--max-batch` images are waiting or `--max-wait-ms` has passed since
+its first image arrived. Requests beyond `--max-queue` waiting images per model are rejected with 503 and Retry-After,
+per-model queue and batch metrics are served at /v1/metrics.
+"""
 
 import argparse
+import asyncio
 import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
+import numpy as np
 import torch
-from flask import Flask, request
-from PIL import Image
+from aiohttp import web
+from PIL import Image, ImageOps
+
+DETECTION_URL = "/v1/object-detection/{model}"
+METRICS_URL = "/v1/metrics"
+ROOT = Path(__file__).resolve().parents[2]  # YOLOv5 root directory, models are loaded from this tree
+
+
+def decode(data):
+    """Decodes uploaded image bytes into an RGB HWC array, applying the EXIF orientation like AutoShape does for PIL."""
+    return np.asarray(ImageOps.exif_transpose(Image.open(io.BytesIO(data))).convert("RGB"))
+
+
+class ModelBatcher:
+    """Gathers concurrent requests for one model into micro-batches and runs one forward pass per batch."""
+
+    def __init__(self, model, size=640, max_batch=8, max_wait_ms=5, max_queue=64):
+        """Wraps an AutoShape `model`, inference runs on a dedicated thread so the event loop keeps serving."""
+        self.model = model
+        self.size = size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.queue = asyncio.Queue(max_queue)
+        self.executor = ThreadPoolExecutor(1)  # one forward pass at a time per model
+        self.task = None
+        self.requests = self.rejected = self.batches = self.images = self.max_queue_depth = 0
+        self.latency = 0.0  # summed request latency (s)
+
+    def start(self):
+        """Starts the batching task on the running event loop."""
+        self.task = asyncio.create_task(self._worker())
+
+    async def submit(self, im):
+        """Queues an RGB HWC image and returns its detections as JSON, raises asyncio.QueueFull when saturated."""
+        if self.queue.full():
+            self.rejected += 1
+            raise asyncio.QueueFull
+        t = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((im, future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        try:
+            return await future
+        finally:
+            self.requests += 1
+            self.latency += time.perf_counter() - t
 
-app = Flask(__name__)
-models = {}
+    def metrics(self):
+        """Returns queue and batch statistics."""
+        return {
+            "queue_depth": self.queue.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "queue_capacity": self.queue.maxsize,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": self.images / self.batches if self.batches else 0.0,
+            "avg_latency_ms": self.latency / self.requests * 1e3 if self.requests else 0.0,
+        }
 
-DETECTION_URL = "/v1/object-detection/<model>"
+    async def _collect(self):
+        """Waits for a first request, then gathers more until the batch is full or `max_wait` has passed."""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if self.queue.empty():
+                get = asyncio.ensure_future(self.queue.get())
+                await asyncio.wait({get}, timeout=max(deadline - loop.time(), 0))
+                if not get.done():
+                    get.cancel()  # a cancelled Queue.get() leaves the item in the queue
+                    break
+                batch.append(get.result())
+            else:
+                batch.append(self.queue.get_nowait())
+        return batch
 
+    async def _worker(self):
+        """Runs batches forever."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            batch = [(im, f) for im, f in batch if not f.done()]  # skip requests cancelled by disconnected clients
+            if not batch:
+                continue
+            try:
+                results = await loop.run_in_executor(self.executor, self._infer, [im for im, _ in batch])
+            except Exception as e:
+                for _, f in batch:
+                    if not f.done():
+                        f.set_exception(e)
+                continue
+            self.batches += 1
+            self.images += len(batch)
+            for (_, f), r in zip(batch, results):
+                if not f.done():
+                    f.set_result(r)
 
-@app.route(DETECTION_URL, methods=["POST"])
-def predict(model):
-    """Predict and return object detections in JSON format given an image and model name via a Flask REST API POST
-    request.
-    """
-    if request.method != "POST":
-        return
+    def _infer(self, ims):
+        """Runs one forward pass and serializes each image's detections with Detections.to_json()."""
+        return self.model(ims, size=self.size).to_json()
 
-    if request.files.get("image"):
-        # Method 1
-        # with request.files["image"] as f:
-        #     im = Image.open(io.BytesIO(f.read()))
 
-        # Method 2
-        im_file = request.files["image"]
-        im_bytes = im_file.read()
-        im = Image.open(io.BytesIO(im_bytes))
+async def predict(request):
+    """Predict and return object detections in JSON format given an image and model name via a POST request."""
+    batcher = request.app["batchers"].get(request.match_info["model"])
+    if batcher is None:
+        raise web.HTTPNotFound(text=f"model {request.match_info['model']} is not served")
+    post = await request.post()
+    image = post.get("image")
+    if not isinstance(image, web.FileField):
+        raise web.HTTPBadRequest(text="POST an image file in the 'image' form field")
 
-        if model in models:
-            results = models[model](im, size=640)  # reduce size=320 for faster inference
-            return results.pandas().xyxy[0].to_json(orient="records")
+    try:
+        im = await asyncio.get_running_loop().run_in_executor(request.app["decode_pool"], decode, image.file.read())
+    except Exception as e:
+        raise web.HTTPBadRequest(text=f"can not decode image: {e}")
+    try:
+        body = await batcher.submit(im)
+    except asyncio.QueueFull:
+        raise web.HTTPServiceUnavailable(text="model queue is full, retry later", headers={"Retry-After": "1"})
+    return web.Response(text=body, content_type="application/json")
+
+
+async def metrics(request):
+    """Returns per-model queue and batch metrics."""
+    return web.json_response({k: b.metrics() for k, b in request.app["batchers"].items()})
+
+
+def create_app(models, size=640, max_batch=8, max_wait_ms=5, max_queue=64, workers=4):
+    """Creates the aiohttp application serving `models`, a dict of name: AutoShape model."""
+
+    async def startup(app):
+        """Creates one batcher per model on the server's event loop."""
+        app["batchers"] = {k: ModelBatcher(m, size, max_batch, max_wait_ms, max_queue) for k, m in models.items()}
+        for b in app["batchers"].values():
+            b.start()
+
+    async def cleanup(app):
+        """Stops the batchers and the thread pools."""
+        for b in app["batchers"].values():
+            b.task.cancel()
+            b.executor.shutdown(wait=False)
+        app["decode_pool"].shutdown(wait=False)
+
+    app = web.Application(client_max_size=64 * 1024**2)  # 64 MB uploads
+    app["decode_pool"] = ThreadPoolExecutor(workers)  # PIL decoding releases the GIL
+    app.on_startup.append(startup)
+    app.on_cleanup.append(cleanup)
+    app.router.add_post(DETECTION_URL, predict)
+    app.router.add_get(METRICS_URL, metrics)
+    return app
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Flask API exposing YOLOv5 model")
+    parser = argparse.ArgumentParser(description="asyncio REST API exposing YOLOv5 models")
     parser.add_argument("--port", default=5000, type=int, help="port number")
     parser.add_argument("--model", nargs="+", default=["yolov5s"], help="model(s) to run, i.e. --model yolov5n yolov5s")
+    parser.add_argument("--size", default=640, type=int, help="inference size (pixels)")
+    parser.add_argument("--max-batch", default=8, type=int, help="maximum images per forward pass")
+    parser.add_argument("--max-wait-ms", default=5, type=float, help="maximum wait for a batch to fill (ms)")
+    parser.add_argument("--max-queue", default=64, type=int, help="maximum waiting images per model before 503")
+    parser.add_argument("--workers", default=4, type=int, help="image decoding threads")
     opt = parser.parse_args()
 
-    for m in opt.model:
-        models[m] = torch.hub.load("ultralytics/yolov5", m, force_reload=True, skip_validation=True)
-
-    app.run(host="0.0.0.0", port=opt.port)  # debug=True causes Restarting with stat
+    models = {m: torch.hub.load(str(ROOT), m, source="local") for m in opt.model}
+    app = create_app(models, opt.size, opt.max_batch, opt.max_wait_ms, opt.max_queue, opt.workers)
+    web.run_app(app, port=opt.port)
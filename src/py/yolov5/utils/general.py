@@ -28,7 +28,6 @@ from zipfile import ZipFile, is_zipfile
 
 import cv2
 import numpy as np
-import pandas as pd
 import pkg_resources as pkg
 import torch
 import torchvision
@@ -63,7 +62,6 @@ FONT = "Arial.ttf"  # https://github.com/ultralytics/assets/releases/download/v0
 
 torch.set_printoptions(linewidth=320, precision=5, profile="long")
 np.set_printoptions(linewidth=320, formatter={"float_kind": "{:11.5g}".format})  # format short g, %precision=5
-pd.options.display.max_columns = 10
 cv2.setNumThreads(0)  # prevent OpenCV from multithreading (incompatible with PyTorch DataLoader)
 os.environ["NUMEXPR_MAX_THREADS"] = str(NUM_THREADS)  # NumExpr max threads
 os.environ["OMP_NUM_THREADS"] = "1" if platform.system() == "darwin" else str(NUM_THREADS)  # OpenMP (PyTorch and SciPy)
@@ -1017,10 +1015,16 @@ def non_max_suppression(
     labels=(),
     max_det=300,
     nm=0,  # number of masks
+    batched=False,  # process the whole batch in one pass instead of looping over images
+    topk=False,  # select the max_nms best boxes with torch.topk instead of sorting all candidates
+    max_per_class=None,  # (optional) keep at most this many candidates per class and image before NMS
 ):
     """
     Non-Maximum Suppression (NMS) on inference results to reject overlapping detections.
 
+    `topk` picks the `max_nms` best boxes of every image with torch.topk() instead of sorting all candidates, boxes with
+    equal scores may then be ordered differently than with the default full sort.
+
     Returns:
          list of detections, on (n,6) tensor per image [xyxy, conf, cls]
     """
@@ -1047,6 +1051,27 @@ def non_max_suppression(
     multi_label &= nc > 1  # multiple labels per box (adds 0.5ms/img)
     merge = False  # use merge-NMS
 
+    if batched:
+        output = _non_max_suppression_batched(
+            prediction,
+            xc,
+            conf_thres,
+            iou_thres,
+            classes,
+            agnostic,
+            multi_label,
+            labels,
+            max_det,
+            nm,
+            max_wh,
+            max_nms,
+            redundant,
+            merge,
+            topk,
+            max_per_class,
+        )
+        return [x.to(device) for x in output] if mps else output
+
     t = time.time()
     mi = 5 + nc  # mask start index
     output = [torch.zeros((0, 6 + nm), device=prediction.device)] * bs
@@ -1077,11 +1102,16 @@ def non_max_suppression(
 
         # Detections matrix nx6 (xyxy, conf, cls)
         if multi_label:
-            i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
+            if max_per_class:  # best boxes per class
+                i, j = _class_topk(x[:, 5:mi], [len(x)], max_per_class, conf_thres)
+            else:
+                i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
             x = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1)
         else:  # best class only
             conf, j = x[:, 5:mi].max(1, keepdim=True)
             x = torch.cat((box, conf, j.float(), mask), 1)[conf.view(-1) > conf_thres]
+            if max_per_class:
+                x = x[_class_cap(x[:, 4], x[:, 5].long(), nc, max_per_class)]
 
         # Filter by class
         if classes is not None:
@@ -1095,7 +1125,10 @@ def non_max_suppression(
         n = x.shape[0]  # number of boxes
         if not n:  # no boxes
             continue
-        x = x[x[:, 4].argsort(descending=True)[:max_nms]]  # sort by confidence and remove excess boxes
+        if topk:
+            x = x[x[:, 4].topk(min(max_nms, n))[1]]  # partial selection of the best boxes, in confidence order
+        else:
+            x = x[x[:, 4].argsort(descending=True)[:max_nms]]  # sort by confidence and remove excess boxes
 
         # Batched NMS
         c = x[:, 5:6] * (0 if agnostic else max_wh)  # classes
@@ -1120,6 +1153,187 @@ def non_max_suppression(
     return output
 
 
+def non_max_suppression_candidates(
+    candidates,
+    conf_thres=0.25,
+    iou_thres=0.45,
+    classes=None,
+    agnostic=False,
+    multi_label=False,
+    max_det=300,
+    nm=0,  # number of masks
+    batched=False,
+    topk=False,
+    max_per_class=None,
+):
+    """
+    non_max_suppression() for the per-image candidate lists a Detect head returns when its `conf_thres` is set.
+
+    Candidates are zero-padded into one (bs, n, no) tensor, padded rows have zero objectness and never pass the
+    confidence filter, so with a head threshold <= `conf_thres` the results match non_max_suppression() on the full
+    output.
+    """
+    if not isinstance(candidates[0], torch.Tensor):  # model output (candidates, train_out)
+        candidates = candidates[0]
+    prediction = torch.nn.utils.rnn.pad_sequence(candidates, batch_first=True)
+    return non_max_suppression(
+        prediction,
+        conf_thres,
+        iou_thres,
+        classes,
+        agnostic,
+        multi_label,
+        max_det=max_det,
+        nm=nm,
+        batched=batched,
+        topk=topk,
+        max_per_class=max_per_class,
+    )
+
+
+def _non_max_suppression_batched(
+    prediction,
+    xc,
+    conf_thres,
+    iou_thres,
+    classes,
+    agnostic,
+    multi_label,
+    labels,
+    max_det,
+    nm,
+    max_wh,
+    max_nms,
+    redundant,
+    merge,
+    topk,
+    max_per_class,
+):
+    """
+    Batched non_max_suppression(): one confidence filter, image index folded into the class offset, one NMS call and a
+    scatter back into per-image outputs.
+
+    Matches the per-image loop (without its time limit), sorts are stable so equal scores keep anchor order.
+    """
+    bs = prediction.shape[0]  # batch size
+    nc = prediction.shape[2] - nm - 5  # number of classes
+    mi = 5 + nc  # mask start index
+
+    bi = xc.nonzero(as_tuple=False)[:, 0]  # image index
+    x = prediction[xc]  # confidence
+
+    # Cat apriori labels if autolabelling
+    if labels and sum(len(lb) for lb in labels):
+        lb = torch.cat(list(labels), 0)
+        v = torch.zeros((len(lb), nc + nm + 5), device=x.device)
+        v[:, :4] = lb[:, 1:5]  # box
+        v[:, 4] = 1.0  # conf
+        v[range(len(lb)), lb[:, 0].long() + 5] = 1.0  # cls
+        x = torch.cat((x, v), 0)
+        bi = torch.cat((bi, *(torch.full((len(lb),), i, device=x.device) for i, lb in enumerate(labels))))
+        if topk or max_per_class:  # both rely on boxes grouped by image
+            i = torch.sort(bi, stable=True)[1]
+            x, bi = x[i], bi[i]
+
+    # Compute conf
+    x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
+
+    # Box/Mask
+    box = xywh2xyxy(x[:, :4])  # center_x, center_y, width, height) to (x1, y1, x2, y2)
+    mask = x[:, mi:]  # zero columns if no masks
+
+    # Detections matrix nx6 (xyxy, conf, cls)
+    if multi_label:
+        if max_per_class:  # best boxes per class and image
+            i, j = _class_topk(x[:, 5:mi], torch.bincount(bi, minlength=bs).tolist(), max_per_class, conf_thres)
+        else:
+            i, j = (x[:, 5:mi] > conf_thres).nonzero(as_tuple=False).T
+        x, bi = torch.cat((box[i], x[i, 5 + j, None], j[:, None].float(), mask[i]), 1), bi[i]
+    else:  # best class only
+        conf, j = x[:, 5:mi].max(1, keepdim=True)
+        i = conf.view(-1) > conf_thres
+        x, bi = torch.cat((box, conf, j.float(), mask), 1)[i], bi[i]
+        if max_per_class:
+            i = _class_cap(x[:, 4], bi * nc + x[:, 5].long(), bs * nc, max_per_class)
+            x, bi = x[i], bi[i]
+
+    # Filter by class
+    if classes is not None:
+        i = (x[:, 5:6] == torch.tensor(classes, device=x.device)).any(1)
+        x, bi = x[i], bi[i]
+
+    # Sort by confidence per image and remove excess boxes
+    n = torch.bincount(bi, minlength=bs)  # number of boxes per image
+    if not topk:
+        i = torch.sort(x[:, 4], descending=True, stable=True)[1]
+        i = i[torch.sort(bi[i], stable=True)[1]]  # group by image, confidence order within each image
+        i = i[_rank_in_group(bi[i], bs) < max_nms]
+        x, bi = x[i], bi[i]
+    elif len(x):  # partial selection of the max_nms best boxes of every image, in confidence order
+        s = torch.nn.utils.rnn.pad_sequence(x[:, 4].split(n.tolist()), batch_first=True, padding_value=-1.0)
+        v, i = s.topk(min(max_nms, s.shape[1]), 1)
+        b, r = (v >= 0).nonzero(as_tuple=True)  # drop padding
+        i = (n.cumsum(0) - n)[b] + i[b, r]
+        x, bi = x[i], bi[i]
+
+    # Batched NMS
+    c = x[:, 5:6] * (0 if agnostic else max_wh)  # classes
+    boxes, scores = x[:, :4] + c, x[:, 4]  # boxes (offset by class), scores
+    if boxes.numel() > (4000 if boxes.device.type == "cpu" else 20000):  # NMS cost grows quadratically with boxes
+        n_nms = torch.bincount(bi, minlength=bs).tolist()  # boxes per image are contiguous after the sort above
+        starts = np.cumsum([0] + n_nms[:-1]).tolist()
+        i = torch.cat(
+            [torchvision.ops.nms(b, s, iou_thres) + k for b, s, k in zip(boxes.split(n_nms), scores.split(n_nms), starts)]
+        )
+    else:  # single NMS call with the image index folded into the class offset, float64 keeps box precision
+        offset = 2.0 ** math.ceil(math.log2(max_wh * (1 if agnostic else nc + 1)))  # image offset > any class offset
+        i = torchvision.ops.nms(boxes.double() + bi[:, None] * offset, scores.double(), iou_thres)  # NMS
+        i = i[torch.sort(bi[i], stable=True)[1]]  # group by image
+    i = i[_rank_in_group(bi[i], bs) < max_det]  # limit detections
+    if merge:  # Merge NMS (boxes merged using weighted mean), per image as it needs all candidate boxes
+        keep = torch.ones_like(i, dtype=torch.bool)
+        for xi in ((1 < n) & (n < 3e3)).nonzero(as_tuple=False).view(-1).tolist():
+            k, b = bi[i] == xi, bi == xi  # kept and candidate boxes of this image
+            # update boxes as boxes(i,4) = weights(i,n) * boxes(n,4)
+            iou = box_iou(boxes[i[k]], boxes[b]) > iou_thres  # iou matrix
+            weights = iou * scores[b][None]  # box weights
+            x[i[k], :4] = torch.mm(weights, x[b, :4]).float() / weights.sum(1, keepdim=True)  # merged boxes
+            if redundant:
+                keep[k.nonzero(as_tuple=False).view(-1)] = iou.sum(1) > 1  # require redundancy
+        i = i[keep]
+
+    return list(x[i].split(torch.bincount(bi[i], minlength=bs).tolist()))
+
+
+def _class_topk(scores, n, k, conf_thres):
+    """
+    Multi-label (row, class) pairs with scores above `conf_thres`, limited to the `k` best rows per class of every
+    image, for (rows, nc) `scores` grouped into images of `n` consecutive rows.
+
+    Zero-padded images go through one torch.topk() over rows, so no nonzero() runs over all (rows, nc) scores.
+    """
+    s = torch.nn.utils.rnn.pad_sequence(scores.split(n), batch_first=True)  # (images, max(n), nc), zero padded
+    v, i = s.topk(min(k, s.shape[1]), 1)  # best rows per image and class
+    b, r, j = (v > conf_thres).nonzero(as_tuple=True)
+    offsets = torch.tensor(np.cumsum([0] + n[:-1]), device=scores.device)  # first row of every image
+    return offsets[b] + i[b, r, j], j
+
+
+def _class_cap(conf, g, ng, k):
+    """Returns a mask keeping the `k` highest `conf` rows of each group in `g` (`ng` groups, e.g. image and class)."""
+    i = torch.sort(conf, descending=True, stable=True)[1]
+    i = i[torch.sort(g[i], stable=True)[1]]  # group, confidence order within each group
+    keep = torch.zeros_like(conf, dtype=torch.bool)
+    keep[i[_rank_in_group(g[i], ng) < k]] = True
+    return keep
+
+
+def _rank_in_group(g, n):
+    """Returns the position of every element within its run for a sorted group index tensor `g` with `n` groups."""
+    counts = torch.bincount(g, minlength=n)
+    return torch.arange(len(g), device=g.device) - (counts.cumsum(0) - counts)[g]
+
+
 def strip_optimizer(f="best.pt", s=""):
     """
     Strips optimizer and optionally saves checkpoint to finalize training; arguments are file path 'f' and save path
@@ -1163,6 +1377,8 @@ def print_mutation(keys, results, hyp, save_dir, bucket, prefix=colorstr("evolve
 
     # Save yaml
     with open(evolve_yaml, "w") as f:
+        import pandas as pd  # imported here to keep pandas off the inference import path
+
         data = pd.read_csv(evolve_csv, skipinitialspace=True)
         data = data.rename(columns=lambda x: x.strip())  # strip keys
         i = np.argmax(fitness(data.values[:, :4]))  #
@@ -103,6 +103,64 @@ class QFocalLoss(nn.Module):
             return loss
 
 
+class TargetAssigner:
+    """
+    Assigns (image, class, x, y, w, h) targets to the anchors and grid cells of all detection layers.
+
+    Grid gains are cached per set of feature-map shapes and the neighbour-cell offsets once, targets are matched against
+    the anchors of every layer in one batched op, with rows in the same (offset, anchor, target) order per layer as a
+    loop over layers. Shared by the detection and segmentation ComputeLoss.
+    """
+
+    def __init__(self, anchors, anchor_t, g=0.5):
+        """Initializes with Detect() anchors (nl, na, 2) in grid units, the anchor-multiple threshold and grid bias."""
+        self.anchors = anchors
+        self.anchor_t = anchor_t
+        self.g = g  # bias
+        off = [[0, 0], [1, 0], [0, 1], [-1, 0], [0, -1]]  # j,k,l,m
+        # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
+        self.off = torch.tensor(off, device=anchors.device).float() * g  # offsets
+        self.shapes, self.gain = None, None  # feature-map shapes, (nl, 2) grid xy gains for those shapes
+
+    def __call__(self, p, targets):
+        """
+        Matches `targets` to the layers of predictions `p` and returns per-layer lists of target classes, boxes (xy
+        within the grid cell, wh), indices (image, anchor, gridy, gridx), anchors, matched target indices and
+        normalized xywh.
+        """
+        shapes = tuple(tuple(x.shape[2:4]) for x in p)
+        if shapes != self.shapes:  # grid gains change only with the input size
+            self.shapes = shapes
+            self.gain = torch.tensor([[nx, ny] for ny, nx in shapes], device=self.anchors.device).float()
+        g, gain = self.g, self.gain[:, None]  # (nl, 1, 2)
+
+        # Match targets to anchors
+        gxy = targets[:, 2:4] * gain  # (nl, nt, 2) grid xy
+        gwh = targets[:, 4:6] * gain  # grid wh
+        r = gwh[:, None] / self.anchors[:, :, None]  # (nl, na, nt, 2) wh ratio
+        match = torch.max(r, 1 / r).max(3)[0] < self.anchor_t  # compare
+
+        # Offsets
+        gxi = gain - gxy  # inverse
+        j, k = ((gxy % 1 < g) & (gxy > 1)).unbind(2)
+        l, m = ((gxi % 1 < g) & (gxi > 1)).unbind(2)
+        near = torch.stack((torch.ones_like(j), j, k, l, m), 1)  # (nl, 5, nt)
+        li, o, a, ti = (near[:, :, None] & match[:, None]).nonzero(as_tuple=True)  # layer, offset, anchor, target
+
+        # Define
+        gxy, gwh, lgain = gxy[li, ti], gwh[li, ti], self.gain[li]
+        gij = torch.minimum((gxy - self.off[o]).long().clamp_(0), (lgain - 1).long())  # grid indices
+        b, c = targets[ti, :2].long().T  # image, class
+        tbox = torch.cat((gxy - gij, gwh), 1)  # box
+        xywhn = torch.cat((gxy, gwh), 1) / lgain.repeat(1, 2)  # xywh normalized
+
+        n = torch.bincount(li, minlength=len(shapes)).tolist()  # targets per layer
+        b, a, gi, gj, c, ti, tbox, xywhn = (x.split(n) for x in (b, a, gij[:, 0], gij[:, 1], c, ti, tbox, xywhn))
+        indices = list(zip(b, a, gj, gi))  # image, anchor, grid
+        anch = [self.anchors[i][x] for i, x in enumerate(a)]  # anchors
+        return list(c), list(tbox), indices, anch, list(ti), list(xywhn)
+
+
 class ComputeLoss:
     """Computes the total loss for YOLOv5 model predictions, including classification, box, and objectness losses."""
 
@@ -134,6 +192,7 @@ class ComputeLoss:
         self.nc = m.nc  # number of classes
         self.nl = m.nl  # number of layers
         self.anchors = m.anchors
+        self.assigner = TargetAssigner(m.anchors, h["anchor_t"])
         self.device = device
 
     def __call__(self, p, targets):  # predictions, targets
@@ -192,63 +251,4 @@ class ComputeLoss:
         """Prepares model targets from input targets (image,class,x,y,w,h) for loss computation, returning class, box,
         indices, and anchors.
         """
-        na, nt = self.na, targets.shape[0]  # number of anchors, targets
-        tcls, tbox, indices, anch = [], [], [], []
-        gain = torch.ones(7, device=self.device)  # normalized to gridspace gain
-        ai = torch.arange(na, device=self.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
-        targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None]), 2)  # append anchor indices
-
-        g = 0.5  # bias
-        off = (
-            torch.tensor(
-                [
-                    [0, 0],
-                    [1, 0],
-                    [0, 1],
-                    [-1, 0],
-                    [0, -1],  # j,k,l,m
-                    # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
-                ],
-                device=self.device,
-            ).float()
-            * g
-        )  # offsets
-
-        for i in range(self.nl):
-            anchors, shape = self.anchors[i], p[i].shape
-            gain[2:6] = torch.tensor(shape)[[3, 2, 3, 2]]  # xyxy gain
-
-            # Match targets to anchors
-            t = targets * gain  # shape(3,n,7)
-            if nt:
-                # Matches
-                r = t[..., 4:6] / anchors[:, None]  # wh ratio
-                j = torch.max(r, 1 / r).max(2)[0] < self.hyp["anchor_t"]  # compare
-                # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
-                t = t[j]  # filter
-
-                # Offsets
-                gxy = t[:, 2:4]  # grid xy
-                gxi = gain[[2, 3]] - gxy  # inverse
-                j, k = ((gxy % 1 < g) & (gxy > 1)).T
-                l, m = ((gxi % 1 < g) & (gxi > 1)).T
-                j = torch.stack((torch.ones_like(j), j, k, l, m))
-                t = t.repeat((5, 1, 1))[j]
-                offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
-            else:
-                t = targets[0]
-                offsets = 0
-
-            # Define
-            bc, gxy, gwh, a = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
-            a, (b, c) = a.long().view(-1), bc.long().T  # anchors, image, class
-            gij = (gxy - offsets).long()
-            gi, gj = gij.T  # grid indices
-
-            # Append
-            indices.append((b, a, gj.clamp_(0, shape[2] - 1), gi.clamp_(0, shape[3] - 1)))  # image, anchor, grid
-            tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
-            anch.append(anchors[a])  # anchors
-            tcls.append(c)  # class
-
-        return tcls, tbox, indices, anch
+        return self.assigner(p, targets)[:4]
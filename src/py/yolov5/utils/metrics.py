@@ -77,6 +77,11 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
             if plot and j == 0:
                 py.append(np.interp(px, mrec, mpre))  # precision at mAP@0.5
 
+    return summarize_pr_curves(px, py, p, r, ap, nt, unique_classes, plot, save_dir, names, eps, prefix)
+
+
+def summarize_pr_curves(px, py, p, r, ap, nt, unique_classes, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+    """Plots per-class P/R/F1 curves and picks P, R, F1, TP and FP at the max mean-F1 confidence of ap_per_class()."""
     # Compute F1 (harmonic mean of precision and recall)
     f1 = 2 * p * r / (p + r + eps)
     names = [v for k, v in names.items() if k in unique_classes]  # list: only classes that have data
@@ -94,6 +99,89 @@ def ap_per_class(tp, conf, pred_cls, target_cls, plot=False, save_dir=".", names
     return tp, fp, p, r, f1, ap, unique_classes.astype(int)
 
 
+class APAccumulator:
+    """
+    Streaming, constant-memory alternative to collecting (correct, conf, pcls, tcls) stats for ap_per_class().
+
+    Predictions are counted into per-class confidence histograms with TP counts per IoU level, so memory is
+    O(nc * bins * niou) no matter how many images are seen. Results approximate ap_per_class() up to the ordering of
+    predictions inside a bin (~1e-3 with the default 1000 bins, the resolution of its P/R curves), so val.run() only
+    uses it with `stream_metrics`. Confidences below 1 / bins all share the first bin, so runs whose predictions are
+    mostly that low are not resolved. compute() can be called at any time, accumulators of several shards are combined
+    with `+=`.
+
+    Usage:
+        stats = APAccumulator(nc=80, niou=10, device=device)
+        stats.update(correct, conf, pcls, tcls)  # per image or per batch
+        tp, fp, p, r, f1, ap, ap_class = stats.compute()
+    """
+
+    def __init__(self, nc, niou=10, bins=1000, device="cpu"):
+        """Initializes empty histograms for `nc` classes, `niou` IoU levels and `bins` confidence bins."""
+        self.nc, self.niou, self.bins = nc, niou, bins
+        self.tp = torch.zeros((nc, bins, niou), dtype=torch.long, device=device)  # true positives per conf bin
+        self.n = torch.zeros((nc, bins), dtype=torch.long, device=device)  # predictions per conf bin
+        self.nt = torch.zeros(nc, dtype=torch.long, device=device)  # labels per class
+
+    def update(self, correct, conf, pcls, tcls):
+        """Adds the (N, niou) `correct` matrix, conf and classes of N predictions and the classes of the labels."""
+        b = (conf * self.bins).long().clamp_(0, self.bins - 1)  # bin b holds conf in [b / bins, (b + 1) / bins)
+        c = pcls.long()
+        self.tp.index_put_((c, b), correct.long(), accumulate=True)
+        self.n.index_put_((c, b), torch.ones_like(b), accumulate=True)
+        self.nt += torch.bincount(tcls.long(), minlength=self.nc)[: self.nc]
+
+    def __iadd__(self, other):
+        """Merges the counts of another accumulator, e.g. from another shard."""
+        self.tp += other.tp.to(self.tp.device)
+        self.n += other.n.to(self.n.device)
+        self.nt += other.nt.to(self.nt.device)
+        return self
+
+    def reset(self):
+        """Clears all counts."""
+        for x in (self.tp, self.n, self.nt):
+            x.zero_()
+
+    def compute(self, plot=False, save_dir=".", names=(), eps=1e-16, prefix=""):
+        """Returns tp, fp, p, r, f1, ap, ap_class like ap_per_class() for the predictions seen so far."""
+        n = self.n.flip(1).cpu().numpy()  # bins in decreasing confidence
+        tpc = self.tp.flip(1).cumsum(1).cpu().numpy()  # TPs at conf >= bin
+        npc = n.cumsum(1)  # predictions at conf >= bin
+        nt = self.nt.cpu().numpy()
+        conf = np.arange(self.bins - 1, -1, -1) / self.bins  # lower bin edges, decreasing
+        unique_classes = np.nonzero(nt)[0]
+        nt = nt[unique_classes]
+
+        # Create Precision-Recall curve and compute AP for each class
+        px, py = np.linspace(0, 1, 1000), []  # for plotting
+        nc = unique_classes.shape[0]  # number of classes with labels
+        ap, p, r = np.zeros((nc, self.niou)), np.zeros((nc, 1000)), np.zeros((nc, 1000))
+        for ci, c in enumerate(unique_classes):
+            i = n[c] > 0  # non-empty bins
+            if not i.any():
+                continue
+            recall = tpc[c, i] / (nt[ci] + eps)  # recall curve
+            precision = tpc[c, i] / npc[c, i, None]  # precision curve
+            r[ci] = np.interp(-px, -conf[i], recall[:, 0], left=0)  # negative x, xp because xp decreases
+            p[ci] = np.interp(-px, -conf[i], precision[:, 0], left=1)  # p at pr_score
+
+            # AP from recall-precision curve
+            for j in range(self.niou):
+                ap[ci, j], mpre, mrec = compute_ap(recall[:, j], precision[:, j])
+                if plot and j == 0:
+                    py.append(np.interp(px, mrec, mpre))  # precision at mAP@0.5
+
+        return summarize_pr_curves(px, py, p, r, ap, nt, unique_classes, plot, save_dir, names, eps, prefix)
+
+    def mean_results(self):
+        """Returns mean P, R, mAP@0.5 and mAP@0.5:0.95 of the predictions seen so far."""
+        if not self.tp.any():
+            return 0.0, 0.0, 0.0, 0.0
+        _, _, p, r, _, ap, _ = self.compute(names={})
+        return p.mean(), r.mean(), ap[:, 0].mean(), ap.mean()
+
+
 def compute_ap(recall, precision):
     """Compute the average precision, given the recall and precision curves
     # Arguments
@@ -121,6 +209,29 @@ def compute_ap(recall, precision):
     return ap, mpre, mrec
 
 
+def match_predictions(iou, correct_class, iouv):
+    """
+    Matches predictions to labels at all IoU thresholds in one pass on the device of `iou`, no host round-trips.
+
+    Same greedy matching as the former per-threshold NumPy loop: every prediction takes its highest-IoU label of the
+    same class above the threshold, then every label keeps the lowest-index prediction among those that took it. `iou`
+    and `correct_class` are (M, N) label x prediction tensors, returns an (N, len(iouv)) bool tensor of correct
+    predictions.
+    """
+    m, n = iou.shape
+    if not m or not n:
+        return torch.zeros((n, len(iouv)), dtype=torch.bool, device=iou.device)
+    iou = torch.where(correct_class, iou, torch.full_like(iou, -1.0))  # -1 never passes a threshold
+    valid = iou >= iouv.view(-1, 1, 1)  # (T, M, N) IoU > threshold and classes match
+    best = torch.where(valid, iou, torch.full_like(iou, -1.0)).argmax(1)  # (T, N) best label per prediction
+    taken = (best[:, None] == torch.arange(m, device=iou.device)[:, None]) & valid.any(1)[:, None]  # (T, M, N)
+    first = taken.byte().argmax(2)  # (T, M) lowest prediction index per label
+    t, j = taken.any(2).nonzero(as_tuple=True)  # thresholds and labels with a match
+    correct = torch.zeros((n, len(iouv)), dtype=torch.bool, device=iou.device)
+    correct[first[t, j], t] = True
+    return correct
+
+
 class ConfusionMatrix:
     """Generates and visualizes a confusion matrix for evaluating object detection classification performance."""
 
@@ -133,51 +244,54 @@ class ConfusionMatrix:
 
     def process_batch(self, detections, labels):
         """
-        Return intersection-over-union (Jaccard index) of boxes.
-
-        Both sets of boxes are expected to be in (x1, y1, x2, y2) format.
+        Updates the confusion matrix with the detections and labels of one image or of a whole batch.
 
         Arguments:
-            detections (Array[N, 6]), x1, y1, x2, y2, conf, class
-            labels (Array[M, 5]), class, x1, y1, x2, y2
+            detections (Array[N, 6]), x1, y1, x2, y2, conf, class, or a list with one such tensor per image
+            labels (Array[M, 5]), class, x1, y1, x2, y2, or a list with one such tensor per image
         Returns:
             None, updates confusion matrix accordingly
         """
+        nc = self.nc
         if detections is None:
-            gt_classes = labels.int()
-            for gc in gt_classes:
-                self.matrix[self.nc, gc] += 1  # background FN
+            self.update(torch.full_like(labels, nc), labels)  # background FN
             return
+        if not isinstance(detections, (list, tuple)):
+            detections, labels = [detections], [labels]
+
+        pairs = [self._match(d[d[:, 4] > self.conf, :6], lb) for d, lb in zip(detections, labels)]  # per image
+        if pairs:
+            self.update(torch.cat([p for p, _ in pairs]), torch.cat([g for _, g in pairs]))  # one bincount per batch
 
-        detections = detections[detections[:, 4] > self.conf]
+    def _match(self, detections, labels):
+        """Matches the detections and labels of one image, returns the (pred_class, gt_class) pairs to count."""
+        nc = self.nc
         gt_classes = labels[:, 0].int()
         detection_classes = detections[:, 5].int()
-        iou = box_iou(labels[:, 1:], detections[:, :4])
+        background = torch.full_like(gt_classes, nc)
+        if not len(labels) or not len(detections):
+            return background, gt_classes  # true background, nothing if there are no labels
 
-        x = torch.where(iou > self.iou_thres)
-        if x[0].shape[0]:
-            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()
-            if x[0].shape[0] > 1:
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
-        else:
-            matches = np.zeros((0, 3))
-
-        n = matches.shape[0] > 0
-        m0, m1, _ = matches.transpose().astype(int)
-        for i, gc in enumerate(gt_classes):
-            j = m0 == i
-            if n and sum(j) == 1:
-                self.matrix[detection_classes[m1[j]], gc] += 1  # correct
-            else:
-                self.matrix[self.nc, gc] += 1  # true background
-
-        if n:
-            for i, dc in enumerate(detection_classes):
-                if not any(m1 == i):
-                    self.matrix[dc, self.nc] += 1  # predicted background
+        # Every detection takes its best label above iou_thres, every label keeps its best detection among those
+        iou = box_iou(labels[:, 1:], detections[:, :4])
+        valid = iou > self.iou_thres
+        best = torch.where(valid, iou, torch.full_like(iou, -1.0)).argmax(0)  # best label per detection
+        picked = (best == torch.arange(len(labels), device=iou.device)[:, None]) & valid.any(0)  # (M, N)
+        m1 = torch.where(picked, iou, torch.full_like(iou, -1.0)).argmax(1)  # detection matched to each label
+        m0 = picked.any(1)  # labels with a match
+        fp = torch.ones(len(detections), dtype=torch.bool, device=iou.device)
+        fp[m1[m0]] = False
+        fp &= m0.any()  # predicted background, only counted in images with any match
+        return (
+            torch.cat((torch.where(m0, detection_classes[m1], background), detection_classes[fp])),  # correct, true bg
+            torch.cat((gt_classes, torch.full_like(detection_classes[fp], nc))),
+        )
+
+    def update(self, pred_classes, gt_classes):
+        """Adds one count per (pred_class, gt_class) pair to the matrix, `nc` being the background class."""
+        n = self.nc + 1
+        counts = torch.bincount((pred_classes * n + gt_classes).long().flatten(), minlength=n * n)
+        self.matrix += counts.view(n, n).cpu().numpy()
 
     def tp_fp(self):
         """Calculates true positives (tp) and false positives (fp) excluding the background class from the confusion
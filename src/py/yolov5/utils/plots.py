@@ -11,8 +11,6 @@ import cv2
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
-import seaborn as sn
 import torch
 from PIL import Image, ImageDraw
 from scipy.ndimage.filters import gaussian_filter1d
@@ -327,6 +325,9 @@ def plot_val_study(file="", dir="", x=None):
 @TryExcept()  # known issue https://github.com/ultralytics/yolov5/issues/5395
 def plot_labels(labels, names=(), save_dir=Path("")):
     """Plots dataset labels, saving correlogram and label images, handles classes, and visualizes bounding boxes."""
+    import pandas as pd  # training-only plotting dependencies, imported here to keep them off the inference path
+    import seaborn as sn
+
     LOGGER.info(f"Plotting labels to {save_dir / 'labels.jpg'}... ")
     c, b = labels[:, 0], labels[:, 1:].transpose()  # classes, boxes
     nc = int(c.max() + 1)  # number of classes
@@ -406,6 +407,8 @@ def plot_evolve(evolve_csv="path/to/evolve.csv"):
 
     Example: from utils.plots import *; plot_evolve()
     """
+    import pandas as pd
+
     evolve_csv = Path(evolve_csv)
     data = pd.read_csv(evolve_csv)
     keys = [x.strip() for x in data.columns]
@@ -437,6 +440,8 @@ def plot_results(file="path/to/results.csv", dir=""):
 
     Example: from utils.plots import *; plot_results('path/to/results.csv')
     """
+    import pandas as pd
+
     save_dir = Path(file).parent if file else Path(dir)
     fig, ax = plt.subplots(2, 5, figsize=(12, 6), tight_layout=True)
     ax = ax.ravel()
@@ -0,0 +1,172 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""
+Pluggable detection postprocessing backends.
+
+The NumPy backend runs NMS and box rescaling on the NumPy outputs of CPU runtimes (ONNX Runtime, OpenCV DNN, OpenVINO)
+directly and does not import torch or torchvision, the torch backend wraps utils.general. detect.py picks its backend
+here, so ONNX Runtime, OpenCV DNN and OpenVINO models on CPU run NMS in NumPy.
+
+Usage:
+    model = DetectMultiBackend('yolov5s.onnx')
+    postprocess = select_postprocess(model)
+    model.numpy_outputs = postprocess.numpy  # keep runtime outputs as NumPy arrays for the NumPy backend
+    pred = postprocess.non_max_suppression(model(im), conf_thres=0.25, iou_thres=0.45)
+"""
+
+import numpy as np
+
+
+def xywh2xyxy(x):
+    """Convert nx4 boxes from [x, y, w, h] to [x1, y1, x2, y2] where xy1=top-left, xy2=bottom-right."""
+    y = np.empty_like(x)
+    y[..., 0] = x[..., 0] - x[..., 2] / 2  # top left x
+    y[..., 1] = x[..., 1] - x[..., 3] / 2  # top left y
+    y[..., 2] = x[..., 0] + x[..., 2] / 2  # bottom right x
+    y[..., 3] = x[..., 1] + x[..., 3] / 2  # bottom right y
+    return y
+
+
+def clip_boxes(boxes, shape):
+    """Clips bounding box coordinates (xyxy) to fit within the specified image shape (height, width)."""
+    boxes[..., [0, 2]] = boxes[..., [0, 2]].clip(0, shape[1])  # x1, x2
+    boxes[..., [1, 3]] = boxes[..., [1, 3]].clip(0, shape[0])  # y1, y2
+
+
+def scale_boxes(img1_shape, boxes, img0_shape, ratio_pad=None):
+    """Rescales (xyxy) bounding boxes from img1_shape to img0_shape, optionally using provided `ratio_pad`."""
+    if ratio_pad is None:  # calculate from img0_shape
+        gain = min(img1_shape[0] / img0_shape[0], img1_shape[1] / img0_shape[1])  # gain  = old / new
+        pad = (img1_shape[1] - img0_shape[1] * gain) / 2, (img1_shape[0] - img0_shape[0] * gain) / 2  # wh padding
+    else:
+        gain = ratio_pad[0][0]
+        pad = ratio_pad[1]
+
+    boxes[..., [0, 2]] -= pad[0]  # x padding
+    boxes[..., [1, 3]] -= pad[1]  # y padding
+    boxes[..., :4] /= gain
+    clip_boxes(boxes, img0_shape)
+    return boxes
+
+
+def nms(boxes, scores, iou_thres):
+    """Greedy NMS over (n,4) xyxy `boxes`, returns kept indices sorted by decreasing score like torchvision.ops.nms()."""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    with np.errstate(divide="ignore", invalid="ignore"):  # degenerate boxes give nan IoU and are never suppressed
+        while order.size:
+            i, order = order[0], order[1:]
+            keep.append(i)
+            w = (np.minimum(x2[i], x2[order]) - np.maximum(x1[i], x1[order])).clip(0)
+            h = (np.minimum(y2[i], y2[order]) - np.maximum(y1[i], y1[order])).clip(0)
+            inter = w * h
+            iou = inter / (areas[i] + areas[order] - inter)
+            order = order[~(iou > iou_thres)]
+    return np.array(keep, dtype=np.int64)
+
+
+def non_max_suppression(
+    prediction,
+    conf_thres=0.25,
+    iou_thres=0.45,
+    classes=None,
+    agnostic=False,
+    multi_label=False,
+    max_det=300,
+    nm=0,  # number of masks
+):
+    """
+    NumPy port of utils.general.non_max_suppression() for runtimes that already return NumPy arrays.
+
+    Returns:
+         list of detections, on (n,6) array per image [xyxy, conf, cls]
+    """
+    assert 0 <= conf_thres <= 1, f"Invalid Confidence threshold {conf_thres}, valid values are between 0.0 and 1.0"
+    assert 0 <= iou_thres <= 1, f"Invalid IoU {iou_thres}, valid values are between 0.0 and 1.0"
+    if isinstance(prediction, (list, tuple)):  # YOLOv5 model in validation model, output = (inference_out, loss_out)
+        prediction = prediction[0]  # select only inference output
+
+    bs = prediction.shape[0]  # batch size
+    nc = prediction.shape[2] - nm - 5  # number of classes
+    xc = prediction[..., 4] > conf_thres  # candidates
+
+    # Settings
+    max_wh = 7680  # (pixels) maximum box width and height
+    max_nms = 30000  # maximum number of boxes into nms()
+    multi_label &= nc > 1  # multiple labels per box
+
+    mi = 5 + nc  # mask start index
+    output = [np.zeros((0, 6 + nm), dtype=np.float32)] * bs
+    for xi, x in enumerate(prediction):  # image index, image inference
+        x = x[xc[xi]].astype(np.float32)  # confidence
+        if not x.shape[0]:
+            continue
+
+        # Compute conf
+        x[:, 5:] *= x[:, 4:5]  # conf = obj_conf * cls_conf
+
+        # Box/Mask
+        box = xywh2xyxy(x[:, :4])
+        mask = x[:, mi:]  # zero columns if no masks
+
+        # Detections matrix nx6 (xyxy, conf, cls)
+        if multi_label:
+            i, j = (x[:, 5:mi] > conf_thres).nonzero()
+            x = np.concatenate((box[i], x[i, 5 + j, None], j[:, None].astype(np.float32), mask[i]), 1)
+        else:  # best class only
+            j = x[:, 5:mi].argmax(1)[:, None]
+            conf = np.take_along_axis(x[:, 5:mi], j, 1)
+            x = np.concatenate((box, conf, j.astype(np.float32), mask), 1)[conf.reshape(-1) > conf_thres]
+
+        # Filter by class
+        if classes is not None:
+            x = x[(x[:, 5:6] == np.array(classes)).any(1)]
+
+        # Check shape
+        if not x.shape[0]:  # no boxes
+            continue
+        x = x[np.argsort(-x[:, 4], kind="stable")[:max_nms]]  # sort by confidence and remove excess boxes
+
+        # Class-offset NMS
+        c = x[:, 5:6] * (0 if agnostic else max_wh)  # classes
+        i = nms(x[:, :4] + c, x[:, 4], iou_thres)[:max_det]  # NMS, limit detections
+        output[xi] = x[i]
+
+    return output
+
+
+class NumpyPostprocess:
+    """Postprocessing on NumPy arrays, for CPU runtimes that should not need torch or torchvision."""
+
+    numpy = True
+
+    def __init__(self):
+        """Binds the NumPy implementations."""
+        self.non_max_suppression = non_max_suppression
+        self.scale_boxes = scale_boxes
+
+
+class TorchPostprocess:
+    """Postprocessing on torch tensors through utils.general, imported on first use."""
+
+    numpy = False
+
+    def __init__(self):
+        """Binds the torch implementations from utils.general."""
+        from utils.general import non_max_suppression, scale_boxes
+
+        self.non_max_suppression = non_max_suppression
+        self.scale_boxes = scale_boxes
+
+
+def select_postprocess(model, device="cpu"):
+    """
+    Picks the postprocess backend for a DetectMultiBackend model (or any object with the same backend flags).
+
+    ONNX Runtime, OpenCV DNN and OpenVINO on CPU already produce NumPy outputs, so they get the NumPy backend; every other
+    backend and any GPU device get the torch backend.
+    """
+    numpy_runtime = any(getattr(model, k, False) for k in ("onnx", "dnn", "xml"))
+    cpu = str(getattr(model, "device", device)).startswith("cpu")
+    return NumpyPostprocess() if numpy_runtime and cpu else TorchPostprocess()
@@ -324,6 +324,39 @@ def polygon2mask(img_size, polygons, color=1, downsample_ratio=1):
     return mask
 
 
+def polygon2mask_crops(img_size, polygons, color=1, downsample_ratio=1):
+    """
+    Rasterizes each polygon only inside its bounding box, aligned to the downsample grid so resizing the crop gives the
+    same pixels as polygon2mask() resizing the full image.
+
+    Args:
+        img_size (tuple): The image size.
+        polygons (list[np.ndarray]): each polygon is [N, M],
+            M is the number of points(Be divided by 2).
+
+    Returns:
+        list of (y, x, mask) per polygon, mask is the downsampled crop with its top left corner at (y, x)
+    """
+    h, w = img_size
+    r = downsample_ratio
+    a = r if h % r == 0 and w % r == 0 else max(h, w)  # crop alignment, whole image if the grids do not line up
+    crops = []
+    for p in polygons:
+        p = np.asarray(p).reshape(-1, 2).astype(np.int32)
+        x0, y0 = p.min(0).clip(0, (w, h)) // a * a
+        x1, y1 = -(-(p.max(0) + 1).clip(0, (w, h)) // a) * a
+        x1, y1 = min(x1, w), min(y1, h)
+        if x1 <= x0 or y1 <= y0:  # outside the image
+            crops.append((0, 0, np.zeros((0, 0), dtype=np.uint8)))
+            continue
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.fillPoly(mask, [p - (x0, y0)], color=color)
+        if r > 1:
+            mask = cv2.resize(mask, ((x1 - x0) // r, (y1 - y0) // r))
+        crops.append((y0 // r, x0 // r, mask))
+    return crops
+
+
 def polygons2masks(img_size, polygons, color, downsample_ratio=1):
     """
     Args:
@@ -332,35 +365,22 @@ def polygons2masks(img_size, polygons, color, downsample_ratio=1):
             N is the number of polygons,
             M is the number of points(Be divided by 2).
     """
-    masks = []
-    for si in range(len(polygons)):
-        mask = polygon2mask(img_size, [polygons[si].reshape(-1)], color, downsample_ratio)
-        masks.append(mask)
-    return np.array(masks)
+    masks = np.zeros((len(polygons), img_size[0] // downsample_ratio, img_size[1] // downsample_ratio), dtype=np.uint8)
+    for mask, (y, x, crop) in zip(masks, polygon2mask_crops(img_size, polygons, color, downsample_ratio)):
+        mask[y : y + crop.shape[0], x : x + crop.shape[1]] = crop
+    return masks
 
 
 def polygons2masks_overlap(img_size, segments, downsample_ratio=1):
-    """Return a (640, 640) overlap mask."""
+    """Return a (640, 640) overlap mask, instances are drawn largest first so smaller ones stay on top."""
     masks = np.zeros(
         (img_size[0] // downsample_ratio, img_size[1] // downsample_ratio),
         dtype=np.int32 if len(segments) > 255 else np.uint8,
     )
-    areas = []
-    ms = []
-    for si in range(len(segments)):
-        mask = polygon2mask(
-            img_size,
-            [segments[si].reshape(-1)],
-            downsample_ratio=downsample_ratio,
-            color=1,
-        )
-        ms.append(mask)
-        areas.append(mask.sum())
-    areas = np.asarray(areas)
-    index = np.argsort(-areas)
-    ms = np.array(ms)[index]
-    for i in range(len(segments)):
-        mask = ms[i] * (i + 1)
-        masks = masks + mask
-        masks = np.clip(masks, a_min=0, a_max=i + 1)
+    crops = polygon2mask_crops(img_size, segments, downsample_ratio=downsample_ratio)
+    areas = np.array([crop.sum() for _, _, crop in crops], dtype=np.int64)
+    index = np.argsort(-areas, kind="stable")  # zero-area (off-image) instances last, ties keep label order
+    for i, j in enumerate(index):
+        y, x, crop = crops[j]
+        masks[y : y + crop.shape[0], x : x + crop.shape[1]][crop > 0] = i + 1
     return masks, index
@@ -5,10 +5,9 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from ..general import xywh2xyxy
-from ..loss import FocalLoss, smooth_BCE
+from ..loss import FocalLoss, TargetAssigner, smooth_BCE
 from ..metrics import bbox_iou
 from ..torch_utils import de_parallel
-from .general import crop_mask
 
 
 class ComputeLoss:
@@ -44,6 +43,7 @@ class ComputeLoss:
         self.nl = m.nl  # number of layers
         self.nm = m.nm  # number of masks
         self.anchors = m.anchors
+        self.assigner = TargetAssigner(m.anchors, h["anchor_t"])
         self.device = device
 
     def __call__(self, preds, targets, masks):  # predictions, targets, model
@@ -91,13 +91,7 @@ class ComputeLoss:
                     masks = F.interpolate(masks[None], (mask_h, mask_w), mode="nearest")[0]
                 marea = xywhn[i][:, 2:].prod(1)  # mask width, height normalized
                 mxyxy = xywh2xyxy(xywhn[i] * torch.tensor([mask_w, mask_h, mask_w, mask_h], device=self.device))
-                for bi in b.unique():
-                    j = b == bi  # matching index
-                    if self.overlap:
-                        mask_gti = torch.where(masks[bi][None] == tidxs[i][j].view(-1, 1, 1), 1.0, 0.0)
-                    else:
-                        mask_gti = masks[tidxs[i]][j]
-                    lseg += self.single_mask_loss(mask_gti, pmask[j], proto[bi], mxyxy[j], marea[j])
+                lseg += self.batch_mask_loss(masks, tidxs[i], pmask, proto, b, mxyxy, marea)
 
             obji = self.BCEobj(pi[..., 4], tobj)
             lobj += obji * self.balance[i]  # obj loss
@@ -114,84 +108,36 @@ class ComputeLoss:
         loss = lbox + lobj + lcls + lseg
         return loss * bs, torch.cat((lbox, lseg, lobj, lcls)).detach()
 
-    def single_mask_loss(self, gt_mask, pred, proto, xyxy, area):
-        """Calculates and normalizes single mask loss for YOLOv5 between predicted and ground truth masks."""
-        pred_mask = (pred @ proto.view(self.nm, -1)).view(-1, *proto.shape[1:])  # (n,32) @ (32,80,80) -> (n,80,80)
-        loss = F.binary_cross_entropy_with_logits(pred_mask, gt_mask, reduction="none")
-        return (crop_mask(loss, xyxy).mean(dim=(1, 2)) / area).mean()
+    def batch_mask_loss(self, masks, tidx, pred, proto, b, xyxy, area):
+        """Calculates the normalized mask loss of all positives of a layer at once, averaged per image and summed over
+        images.
+        """
+        bs, nm, h, w = proto.shape
+        n = torch.bincount(b, minlength=bs)  # positives per image
+        i = b.argsort(stable=True)  # group positives by image
+        b, tidx, pred, xyxy, area = b[i], tidx[i], pred[i], xyxy[i], area[i]
+        j = n.cumsum(0).tolist()
+        pred_mask = torch.cat([pred[j0:j1] @ proto[bi].view(nm, -1) for bi, (j0, j1) in enumerate(zip([0] + j, j))])
+        if self.overlap:
+            sign = torch.where(masks.view(bs, -1)[b] == tidx[:, None], -1.0, 1.0)
+        else:
+            sign = 1 - 2 * masks.view(len(masks), -1)[tidx]
+        loss = F.softplus(pred_mask * sign).view(-1, h, w)  # BCE with logits, log(1 + exp(-x)) inside the mask
+        x1, y1, x2, y2 = xyxy.T  # crop is separable, sum the box columns of each row then the box rows
+        r = torch.arange(w, device=xyxy.device, dtype=xyxy.dtype)
+        c = torch.arange(h, device=xyxy.device, dtype=xyxy.dtype)
+        mx = ((r >= x1[:, None]) & (r < x2[:, None])).type(loss.dtype)  # (n,w) box columns
+        my = ((c >= y1[:, None]) & (c < y2[:, None])).type(loss.dtype)  # (n,h) box rows
+        loss = (loss @ mx[..., None]).squeeze(-1).mul(my).sum(1) / (h * w)  # cropped mean
+        return (loss / area / n[b]).sum()
 
     def build_targets(self, p, targets):
         """Prepares YOLOv5 targets for loss computation; inputs targets (image, class, x, y, w, h), output target
         classes/boxes.
         """
-        na, nt = self.na, targets.shape[0]  # number of anchors, targets
-        tcls, tbox, indices, anch, tidxs, xywhn = [], [], [], [], [], []
-        gain = torch.ones(8, device=self.device)  # normalized to gridspace gain
-        ai = torch.arange(na, device=self.device).float().view(na, 1).repeat(1, nt)  # same as .repeat_interleave(nt)
-        if self.overlap:
-            batch = p[0].shape[0]
-            ti = []
-            for i in range(batch):
-                num = (targets[:, 0] == i).sum()  # find number of targets of each image
-                ti.append(torch.arange(num, device=self.device).float().view(1, num).repeat(na, 1) + 1)  # (na, num)
-            ti = torch.cat(ti, 1)  # (na, nt)
-        else:
-            ti = torch.arange(nt, device=self.device).float().view(1, nt).repeat(na, 1)
-        targets = torch.cat((targets.repeat(na, 1, 1), ai[..., None], ti[..., None]), 2)  # append anchor indices
-
-        g = 0.5  # bias
-        off = (
-            torch.tensor(
-                [
-                    [0, 0],
-                    [1, 0],
-                    [0, 1],
-                    [-1, 0],
-                    [0, -1],  # j,k,l,m
-                    # [1, 1], [1, -1], [-1, 1], [-1, -1],  # jk,jm,lk,lm
-                ],
-                device=self.device,
-            ).float()
-            * g
-        )  # offsets
-
-        for i in range(self.nl):
-            anchors, shape = self.anchors[i], p[i].shape
-            gain[2:6] = torch.tensor(shape)[[3, 2, 3, 2]]  # xyxy gain
-
-            # Match targets to anchors
-            t = targets * gain  # shape(3,n,7)
-            if nt:
-                # Matches
-                r = t[..., 4:6] / anchors[:, None]  # wh ratio
-                j = torch.max(r, 1 / r).max(2)[0] < self.hyp["anchor_t"]  # compare
-                # j = wh_iou(anchors, t[:, 4:6]) > model.hyp['iou_t']  # iou(3,n)=wh_iou(anchors(3,2), gwh(n,2))
-                t = t[j]  # filter
-
-                # Offsets
-                gxy = t[:, 2:4]  # grid xy
-                gxi = gain[[2, 3]] - gxy  # inverse
-                j, k = ((gxy % 1 < g) & (gxy > 1)).T
-                l, m = ((gxi % 1 < g) & (gxi > 1)).T
-                j = torch.stack((torch.ones_like(j), j, k, l, m))
-                t = t.repeat((5, 1, 1))[j]
-                offsets = (torch.zeros_like(gxy)[None] + off[:, None])[j]
-            else:
-                t = targets[0]
-                offsets = 0
-
-            # Define
-            bc, gxy, gwh, at = t.chunk(4, 1)  # (image, class), grid xy, grid wh, anchors
-            (a, tidx), (b, c) = at.long().T, bc.long().T  # anchors, image, class
-            gij = (gxy - offsets).long()
-            gi, gj = gij.T  # grid indices
-
-            # Append
-            indices.append((b, a, gj.clamp_(0, shape[2] - 1), gi.clamp_(0, shape[3] - 1)))  # image, anchor, grid
-            tbox.append(torch.cat((gxy - gij, gwh), 1))  # box
-            anch.append(anchors[a])  # anchors
-            tcls.append(c)  # class
-            tidxs.append(tidx)
-            xywhn.append(torch.cat((gxy, gwh), 1) / gain[2:6])  # xywh normalized
-
+        tcls, tbox, indices, anch, tidxs, xywhn = self.assigner(p, targets)
+        if self.overlap:  # mask indices count from 1 within each image
+            n = torch.bincount(targets[:, 0].long(), minlength=p[0].shape[0])  # targets per image
+            ti = torch.arange(len(targets), device=self.device) - (n.cumsum(0) - n).repeat_interleave(n) + 1
+            tidxs = [ti[x] for x in tidxs]
         return tcls, tbox, indices, anch, tidxs, xywhn
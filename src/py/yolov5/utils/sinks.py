@@ -0,0 +1,119 @@
+# Ultralytics 🚀 AGPL-3.0 License - https://ultralytics.com/license
+"""
+Background result sinks for inference scripts.
+
+ResultWriter takes CSV rows, label lines, images, video frames and crops through a bounded queue and writes them on a
+worker thread with persistent file handles, so the inference loop does not wait on the filesystem or on image and video
+encoding. Items are written in submission order.
+
+Usage:
+    with ResultWriter(save_dir / 'predictions.csv') as writer:  # close() on exit flushes and releases all writers
+        writer.csv([('im.jpg', 'person', '0.87')])
+        writer.txt('labels/im.txt', ['0 0.5 0.5 0.2 0.3'])
+        writer.image('im.jpg', im0)
+"""
+
+import csv
+import queue
+import threading
+from pathlib import Path
+
+import cv2
+
+from utils.general import LOGGER
+
+CSV_HEADER = ("Image Name", "Prediction", "Confidence")
+
+
+class ResultWriter:
+    """Writes inference results on a background thread in the order they were submitted."""
+
+    def __init__(self, csv_path=None, maxsize=64):
+        """Starts the worker, `maxsize` bounds the number of queued items (images included) before submit blocks."""
+        self.csv_path = csv_path
+        self.csv_file = self.csv_writer = None
+        self.videos = {}  # key: cv2.VideoWriter
+        self.queue = queue.Queue(maxsize)
+        self.thread = threading.Thread(target=self._worker, name="result-writer", daemon=True)
+        self.thread.start()
+
+    def csv(self, rows):
+        """Appends (image name, prediction, confidence) rows to the CSV file, writing the header once."""
+        self.queue.put((self._write_csv, (rows,), {}))
+
+    def txt(self, path, lines):
+        """Appends all label lines of one image to `path` with a single open()."""
+        self.queue.put((self._write_txt, (path, lines), {}))
+
+    def image(self, path, im):
+        """Encodes and saves `im` to `path`, `im` must not be modified afterwards."""
+        self.queue.put((cv2.imwrite, (str(path), im), {}))
+
+    def video_open(self, key, path, fps, size):
+        """Releases the current video writer of `key` and opens a new mp4v writer at `path`."""
+        self.queue.put((self._open_video, (key, path, fps, size), {}))
+
+    def video(self, key, im):
+        """Appends frame `im` to the video writer of `key`."""
+        self.queue.put((self._write_video, (key, im), {}))
+
+    def submit(self, fn, *args, **kwargs):
+        """Runs any other writing function `fn(*args, **kwargs)` on the worker, e.g. save_one_box()."""
+        self.queue.put((fn, args, kwargs))
+
+    def close(self):
+        """Waits until everything is written, then closes the CSV file and releases all video writers."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        """Returns the writer for use in a `with` block."""
+        return self
+
+    def __exit__(self, exc_type, value, traceback):
+        """Closes the writer when the `with` block exits, also on exceptions and KeyboardInterrupt."""
+        self.close()
+
+    def _worker(self):
+        """Runs queued writes until close(), flushing the CSV file whenever the queue runs empty."""
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            fn, args, kwargs = item
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                LOGGER.warning(f"WARNING ⚠️ result writer: {e}")
+            if self.csv_file and self.queue.empty():
+                self.csv_file.flush()  # batch rows while busy, flush when idle
+        if self.csv_file:
+            self.csv_file.close()
+        for v in self.videos.values():
+            v.release()
+
+    def _write_csv(self, rows):
+        """Writes CSV rows through the persistent file handle, opened on first use."""
+        if self.csv_writer is None:
+            exists = Path(self.csv_path).is_file()
+            self.csv_file = open(self.csv_path, mode="a", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            if not exists:
+                self.csv_writer.writerow(CSV_HEADER)
+        self.csv_writer.writerows(rows)
+
+    @staticmethod
+    def _write_txt(path, lines):
+        """Appends label lines to a text file."""
+        with open(path, "a") as f:
+            f.writelines(f"{x}\n" for x in lines)
+
+    def _open_video(self, key, path, fps, size):
+        """Replaces the video writer of `key`."""
+        if key in self.videos:
+            self.videos.pop(key).release()  # release previous video writer
+        self.videos[key] = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+
+    def _write_video(self, key, im):
+        """Writes one frame."""
+        self.videos[key].write(im)
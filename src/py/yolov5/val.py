@@ -56,7 +56,7 @@ from utils.general import (
     xywh2xyxy,
     xyxy2xywh,
 )
-from utils.metrics import ConfusionMatrix, ap_per_class, box_iou
+from utils.metrics import APAccumulator, ConfusionMatrix, ap_per_class, box_iou, match_predictions
 from utils.plots import output_to_target, plot_images, plot_val_study
 from utils.torch_utils import select_device, smart_inference_mode
 
@@ -168,20 +168,9 @@ def process_batch(detections, labels, iouv):
         - This function is used as part of the evaluation pipeline for object detection models.
         - IoU (Intersection over Union) is a common evaluation metric for object detection performance.
     """
-    correct = np.zeros((detections.shape[0], iouv.shape[0])).astype(bool)
     iou = box_iou(labels[:, 1:], detections[:, :4])
     correct_class = labels[:, 0:1] == detections[:, 5]
-    for i in range(len(iouv)):
-        x = torch.where((iou >= iouv[i]) & correct_class)  # IoU > threshold and classes match
-        if x[0].shape[0]:
-            matches = torch.cat((torch.stack(x, 1), iou[x[0], x[1]][:, None]), 1).cpu().numpy()  # [label, detect, iou]
-            if x[0].shape[0] > 1:
-                matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
-                # matches = matches[matches[:, 2].argsort()[::-1]]
-                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
-            correct[matches[:, 1].astype(int), i] = True
-    return torch.tensor(correct, dtype=torch.bool, device=iouv.device)
+    return match_predictions(iou, correct_class, iouv)
 
 
 @smart_inference_mode()
@@ -208,6 +197,9 @@ def run(
     exist_ok=False,  # existing project/name ok, do not increment
     half=True,  # use FP16 half-precision inference
     dnn=False,  # use OpenCV DNN for ONNX inference
+    topk_nms=False,  # select NMS candidates with torch.topk instead of a full sort
+    max_per_class=None,  # (optional) maximum NMS candidates per class and image
+    stream_metrics=False,  # approximate AP from constant-memory confidence histograms
     model=None,
     dataloader=None,
     save_dir=Path(""),
@@ -243,6 +235,11 @@ def run(
         exist_ok (bool, optional): Overwrite existing project/name without incrementing. Default is False.
         half (bool, optional): Use FP16 half-precision inference. Default is True.
         dnn (bool, optional): Use OpenCV DNN for ONNX inference. Default is False.
+        topk_nms (bool, optional): Select the NMS candidates with torch.topk instead of a full confidence sort, faster
+            at low `conf_thres`, boxes with equal scores may be ordered differently. Default is False.
+        max_per_class (int, optional): Maximum NMS candidates kept per class and image, None keeps all. Default is None.
+        stream_metrics (bool, optional): Count predictions into APAccumulator confidence histograms instead of keeping
+            them all for ap_per_class(), constant memory but AP is approximate (~1e-3). Default is False.
         model (torch.nn.Module, optional): Model object for training. Default is None.
         dataloader (torch.utils.data.DataLoader, optional): Dataloader object. Default is None.
         save_dir (Path, optional): Directory to save results. Default is Path('').
@@ -323,7 +320,8 @@ def run(
     tp, fp, p, r, f1, mp, mr, map50, ap50, map = 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
     dt = Profile(device=device), Profile(device=device), Profile(device=device)  # profiling times
     loss = torch.zeros(3, device=device)
-    jdict, stats, ap, ap_class = [], [], [], []
+    jdict, ap, ap_class = [], [], []
+    stats = APAccumulator(nc, niou, device=device) if stream_metrics else []  # (correct, conf, pcls, tcls)
     callbacks.run("on_val_start")
     pbar = tqdm(dataloader, desc=s, bar_format=TQDM_BAR_FORMAT)  # progress bar
     for batch_i, (im, targets, paths, shapes) in enumerate(pbar):
@@ -349,10 +347,20 @@ def run(
         lb = [targets[targets[:, 0] == i, 1:] for i in range(nb)] if save_hybrid else []  # for autolabelling
         with dt[2]:
             preds = non_max_suppression(
-                preds, conf_thres, iou_thres, labels=lb, multi_label=True, agnostic=single_cls, max_det=max_det
+                preds,
+                conf_thres,
+                iou_thres,
+                labels=lb,
+                multi_label=True,
+                agnostic=single_cls,
+                max_det=max_det,
+                topk=topk_nms,
+                max_per_class=max_per_class,
+                batched=True,
             )
 
         # Metrics
+        cm_preds, cm_labels = [], []  # confusion matrix inputs, updated once per batch
         for si, pred in enumerate(preds):
             labels = targets[targets[:, 0] == si, 1:]
             nl, npr = labels.shape[0], pred.shape[0]  # number of labels, predictions
@@ -362,7 +370,10 @@ def run(
 
             if npr == 0:
                 if nl:
-                    stats.append((correct, *torch.zeros((2, 0), device=device), labels[:, 0]))
+                    if stream_metrics:
+                        stats.update(correct, *torch.zeros((2, 0), device=device), labels[:, 0])
+                    else:
+                        stats.append((correct, *torch.zeros((2, 0), device=device), labels[:, 0]))
                     if plots:
                         confusion_matrix.process_batch(detections=None, labels=labels[:, 0])
                 continue
@@ -380,8 +391,12 @@ def run(
                 labelsn = torch.cat((labels[:, 0:1], tbox), 1)  # native-space labels
                 correct = process_batch(predn, labelsn, iouv)
                 if plots:
-                    confusion_matrix.process_batch(predn, labelsn)
-            stats.append((correct, pred[:, 4], pred[:, 5], labels[:, 0]))  # (correct, conf, pcls, tcls)
+                    cm_preds.append(predn)
+                    cm_labels.append(labelsn)
+            if stream_metrics:
+                stats.update(correct, pred[:, 4], pred[:, 5], labels[:, 0])
+            else:
+                stats.append((correct, pred[:, 4], pred[:, 5], labels[:, 0]))  # (correct, conf, pcls, tcls)
 
             # Save/log
             if save_txt:
@@ -390,6 +405,8 @@ def run(
             if save_json:
                 save_one_json(predn, jdict, path, class_map)  # append to COCO-JSON dictionary
             callbacks.run("on_val_image_end", pred, predn, path, names, im[si])
+        if cm_preds:
+            confusion_matrix.process_batch(cm_preds, cm_labels)
 
         # Plot images
         if plots and batch_i < 3:
@@ -399,12 +416,19 @@ def run(
         callbacks.run("on_val_batch_end", batch_i, im, targets, paths, shapes, preds)
 
     # Compute metrics
-    stats = [torch.cat(x, 0).cpu().numpy() for x in zip(*stats)]  # to numpy
-    if len(stats) and stats[0].any():
-        tp, fp, p, r, f1, ap, ap_class = ap_per_class(*stats, plot=plots, save_dir=save_dir, names=names)
+    if stream_metrics:
+        results = stats.compute(plot=plots, save_dir=save_dir, names=names) if stats.tp.any() else None
+        nt = stats.nt.cpu().numpy()  # number of targets per class
+    else:
+        stats = [torch.cat(x, 0).cpu().numpy() for x in zip(*stats)]  # to numpy
+        results = None
+        if len(stats) and stats[0].any():
+            results = ap_per_class(*stats, plot=plots, save_dir=save_dir, names=names)
+        nt = np.bincount(stats[3].astype(int), minlength=nc)  # number of targets per class
+    if results is not None:
+        tp, fp, p, r, f1, ap, ap_class = results
         ap50, ap = ap[:, 0], ap.mean(1)  # AP@0.5, AP@0.5:0.95
         mp, mr, map50, map = p.mean(), r.mean(), ap50.mean(), ap.mean()
-    nt = np.bincount(stats[3].astype(int), minlength=nc)  # number of targets per class
 
     # Print results
     pf = "%22s" + "%11i" * 2 + "%11.3g" * 4  # print format
@@ -413,7 +437,7 @@ def run(
         LOGGER.warning(f"WARNING ⚠️ no labels found in {task} set, can not compute metrics without labels")
 
     # Print results per class
-    if (verbose or (nc < 50 and not training)) and nc > 1 and len(stats):
+    if (verbose or (nc < 50 and not training)) and nc > 1:
         for i, c in enumerate(ap_class):
             LOGGER.info(pf % (names[c], seen, nt[c], p[i], r[i], ap50[i], ap[i]))
 
@@ -494,6 +518,9 @@ def parse_opt():
         exist_ok (bool, optional): If set, existing directory will not be incremented. Default is False.
         half (bool, optional): If set, uses FP16 half-precision inference. Default is False.
         dnn (bool, optional): If set, uses OpenCV DNN for ONNX inference. Default is False.
+        topk_nms (bool, optional): If set, selects NMS candidates with torch.topk instead of sorting. Default is False.
+        max_per_class (int, optional): Maximum NMS candidates per class and image. Default is None (no limit).
+        stream_metrics (bool, optional): If set, approximates AP from constant-memory histograms. Default is False.
 
     Returns:
         argparse.Namespace: Parsed command-line options.
@@ -537,6 +564,9 @@ def parse_opt():
     parser.add_argument("--exist-ok", action="store_true", help="existing project/name ok, do not increment")
     parser.add_argument("--half", action="store_true", help="use FP16 half-precision inference")
     parser.add_argument("--dnn", action="store_true", help="use OpenCV DNN for ONNX inference")
+    parser.add_argument("--topk-nms", action="store_true", help="select NMS candidates with topk instead of sorting")
+    parser.add_argument("--max-per-class", type=int, default=None, help="maximum NMS candidates per class and image")
+    parser.add_argument("--stream-metrics", action="store_true", help="approximate AP in constant memory")
     opt = parser.parse_args()
     opt.data = check_yaml(opt.data)  # check YAML
     opt.save_json |= opt.data.endswith("coco.yaml")